@@ -0,0 +1,3 @@
+"""
+Componenti condivisi tra coordinatore e worker
+"""
@@ -0,0 +1,189 @@
+"""
+Tracing - Correlazione end-to-end dal messaggio sorgente al post pubblicato
+Ogni fase (ciclo del coordinatore, chiamata /scrape, lettura del canale,
+parse_message, post_deal) apre uno span. Il contesto viaggia nell'header
+`traceparent` (formato W3C) e nel campo `traceparent` dei deals, così un
+deal lento si ricollega alla fase esatta che l'ha trattenuto.
+
+Export (TRACE_EXPORT): percorso di un file JSON lines oppure URL http(s)
+di un collector a cui inviare gli span a blocchi. Senza TRACE_EXPORT gli
+id vengono comunque propagati, ma nessuno span viene scritto.
+"""
+
+import os
+import json
+import time
+import queue
+import logging
+import threading
+import urllib.request
+from typing import Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT_HEADER = 'traceparent'
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str]]:
+    """(trace_id, span_id) da un header traceparent, None se assente o malformato"""
+    if not value:
+        return None
+    parts = value.strip().split('-')
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    return parts[1], parts[2]
+
+
+class Span:
+    """Una fase della pipeline, con durata e attributi"""
+
+    def __init__(self, tracer: 'Tracer', name: str, trace_id: str, parent_id: Optional[str], attributes: Dict):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.error: Optional[str] = None
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self._ended = False
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def fail(self, error: BaseException):
+        self.error = f"{type(error).__name__}: {error}"
+
+    def end(self, **attributes):
+        """Chiude lo span (una sola volta) e lo passa all'exporter"""
+        if self._ended:
+            return
+        self._ended = True
+        self.attributes.update(attributes)
+        self.tracer.export(self, time.perf_counter() - self._started)
+
+    def __enter__(self) -> 'Span':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.fail(exc)
+        self.end()
+        return False
+
+
+class SpanExporter:
+    """Thread che scrive gli span conclusi su file o li invia al collector"""
+
+    def __init__(self, target: str, batch_size: int = 100, interval: float = 2.0, timeout: float = 5.0):
+        self.target = target
+        self.batch_size = batch_size
+        self.interval = interval
+        self.timeout = timeout
+        self.queue: queue.Queue = queue.Queue(maxsize=10000)
+        self.dropped = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='span-exporter', daemon=True)
+        self._thread.start()
+
+    def put(self, record: Dict):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Il tracing non deve mai rallentare la pipeline
+            self.dropped += 1
+
+    def _drain(self) -> List[Dict]:
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._stop.wait(self.interval)
+            while True:
+                batch = self._drain()
+                if not batch:
+                    break
+                try:
+                    self._write(batch)
+                except Exception as e:
+                    logger.warning(f"⚠️ Export di {len(batch)} span fallito: {e}")
+
+    def _write(self, batch: List[Dict]):
+        if self.target.startswith(('http://', 'https://')):
+            request = urllib.request.Request(
+                self.target,
+                data=json.dumps({'spans': batch}).encode(),
+                headers={'Content-Type': 'application/json'},
+                method='POST'
+            )
+            with urllib.request.urlopen(request, timeout=self.timeout):
+                pass
+        else:
+            with open(self.target, 'a', encoding='utf-8') as f:
+                f.writelines(json.dumps(record, ensure_ascii=False) + '\n' for record in batch)
+
+    def close(self):
+        """Ferma il thread dopo aver esportato gli span in coda"""
+        self._stop.set()
+        self._thread.join(timeout=self.timeout)
+
+
+class Tracer:
+    """Crea gli span di un servizio e li consegna all'exporter (se configurato)"""
+
+    def __init__(self, service: str, exporter: Optional[SpanExporter] = None):
+        self.service = service
+        self.exporter = exporter
+
+    def span(self, name: str, parent: Union['Span', str, None] = None, **attributes) -> Span:
+        """Nuovo span figlio di `parent` (Span o traceparent); senza parent apre una nuova trace"""
+        if isinstance(parent, Span):
+            context = (parent.trace_id, parent.span_id)
+        else:
+            context = parse_traceparent(parent)
+        trace_id, parent_id = context if context else (os.urandom(16).hex(), None)
+        return Span(self, name, trace_id, parent_id, dict(attributes))
+
+    def export(self, span: Span, duration: float):
+        if self.exporter is None:
+            return
+        self.exporter.put({
+            'service': self.service,
+            'name': span.name,
+            'trace_id': span.trace_id,
+            'span_id': span.span_id,
+            'parent_id': span.parent_id,
+            'start': span.start,
+            'duration_ms': round(duration * 1000, 3),
+            'status': 'error' if span.error else 'ok',
+            'error': span.error,
+            'attributes': span.attributes,
+        })
+
+    def close(self):
+        if self.exporter:
+            self.exporter.close()
+
+    @classmethod
+    def from_env(cls, service: str) -> 'Tracer':
+        """Tracer configurato da TRACE_EXPORT (file JSON lines o URL del collector)"""
+        target = os.getenv('TRACE_EXPORT', '')
+        if not target:
+            return cls(service)
+        logger.info(f"🧵 Tracing {service}: export verso {target}")
+        return cls(service, SpanExporter(
+            target,
+            batch_size=int(os.getenv('TRACE_BATCH_SIZE', 100)),
+            interval=float(os.getenv('TRACE_FLUSH_SECONDS', 2))
+        ))
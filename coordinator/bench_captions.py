@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark caption - Costo per deal della pulizia caption in post_deal
+Confronta le tre re.sub originali con il CaptionSanitizer precompilato
+su caption reali dei canali sorgente UK e IT.
+
+Uso: python coordinator/bench_captions.py [iterazioni]
+"""
+
+import re
+import sys
+import timeit
+
+from captions import CaptionSanitizer
+
+# Caption reali (tag affiliato già sostituito dal worker)
+SAMPLE_CAPTIONS = [
+    # @NicePriceDeals (UK)
+    "About £12.99 💥 48% Price drop\n"
+    "https://www.amazon.co.uk/dp/B0DS63GM2Z/?psc=1&tag=ukbestdeal02-21\n"
+    "Anker USB C Charger 65W, 735 Charger (Nano II 65W) 3-Port Fast Compact Foldable Wall Charger\n"
+    "#ad Price and promotions are accurate at the time of posting but can change or expire at any time",
+
+    "About £4.49 💥 55% Price drop\n"
+    "https://www.amazon.co.uk/dp/B07PGL2N7J?tag=ukbestdeal02-21  \n"
+    "Amazon Basics AA Industrial Alkaline Batteries, Pack of 40   \n\n\n"
+    "#ad Price and promotions are accurate at the time of posting but can change or expire at any time",
+
+    "About £189.00 💥 24% Price drop\n"
+    "https://www.amazon.co.uk/dp/B0CHX1W1XY?tag=ukbestdeal02-21\n"
+    "Apple AirPods Pro (2nd Generation) with MagSafe Case (USB‑C)\n"
+    "#ad Price and promotions are accurate at the time of posting but can change or expire at any time",
+
+    # @salvatore_aranzulla_offerte (IT)
+    "🔥 Xiaomi Redmi Note 13 Pro 5G 8/256GB\n\n"
+    "💰 249,90€ invece di 399,90€ (-38%)\n\n"
+    "https://www.amazon.it/dp/B0CRKTBYLQ?tag=srzone00-21\n\n"
+    "#affiliate: https://gomining.uk/amzn",
+
+    "Philips Airfryer Serie 3000 XL 6,2L\n"
+    "💰 89,99€ (-40%)\n"
+    "https://amzn.eu/d/8f3kPq1\n"
+    "#affiliate: https://gomining.uk/amzn",
+
+    "De'Longhi Magnifica S ECAM22.110.B macchina caffè automatica\n\n\n\n"
+    "💰 279,00€ anziché 449,99€\n"
+    "https://www.amazon.it/De-Longhi-Magnifica-ECAM22-110-B/dp/B001J6FP8O/?tag=srzone00-21&th=1\n"
+    "#affiliate: https://gomining.uk/amzn",
+]
+
+
+def legacy_clean(text: str) -> str:
+    """Pulizia originale di post_deal: tre passate non precompilate"""
+    text = re.sub(r'https://www\.amazon\.co\.uk/[^\s\n]+', '', text)
+    text = re.sub(r'https://www\.amazon\.it/[^\s\n]+', '', text)
+    text = re.sub(r'https://amzn\.(to|eu)/[^\s\n]+', '', text)
+    return text.strip()
+
+
+def legacy_clean_normalised(text: str) -> str:
+    """Pulizia originale più la stessa normalizzazione spazi, con re.sub non precompilate"""
+    text = legacy_clean(text)
+    text = re.sub(r'[ \t]+\n', '\n', text)
+    text = re.sub(r'\n{3,}', '\n\n', text)
+    return text.strip()
+
+
+def bench(name: str, func, iterations: int) -> float:
+    timer = timeit.Timer(lambda: [func(caption) for caption in SAMPLE_CAPTIONS])
+    best = min(timer.repeat(repeat=5, number=iterations))
+    per_caption_us = best / (iterations * len(SAMPLE_CAPTIONS)) * 1e6
+    print(f"{name:<24} {per_caption_us:8.2f} µs/caption")
+    return per_caption_us
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    sanitizer = CaptionSanitizer(['amazon.co.uk', 'amazon.it'])
+
+    # Il risultato deve restare senza link Amazon
+    for caption in SAMPLE_CAPTIONS:
+        cleaned = sanitizer.clean(caption)
+        assert 'amazon.' not in cleaned and 'amzn.' not in cleaned, cleaned
+
+    print(f"📏 {len(SAMPLE_CAPTIONS)} caption x {iterations} iterazioni (migliore di 5)")
+    bench('legacy (solo link)', legacy_clean, iterations)
+    legacy = bench('legacy + spazi', legacy_clean_normalised, iterations)
+    compiled = bench('CaptionSanitizer', sanitizer.clean, iterations)
+    print(f"{'speedup (stesso lavoro)':<24} {legacy / compiled:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
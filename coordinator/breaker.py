@@ -0,0 +1,92 @@
+"""
+Breaker - Circuit breaker per worker
+closed → open quando il tasso di errori (o di chiamate lente) supera la
+soglia; dopo il cooldown half_open, in cui un probe leggero decide se
+richiudere o riaprire (con cooldown raddoppiato).
+"""
+
+import os
+import time
+import logging
+from collections import deque
+from typing import Deque, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """Stato di salute di un worker calcolato su una finestra di chiamate recenti"""
+
+    def __init__(self, name: str, slow_threshold: float):
+        self.name = name
+        self.slow_threshold = slow_threshold
+        self.window = int(os.getenv('BREAKER_WINDOW', 10))
+        self.min_calls = int(os.getenv('BREAKER_MIN_CALLS', 3))
+        self.error_threshold = float(os.getenv('BREAKER_ERROR_RATE', 0.5))
+        self.slow_ratio = float(os.getenv('BREAKER_SLOW_RATE', 0.5))
+        self.base_open_seconds = float(os.getenv('BREAKER_OPEN_SECONDS', 300))
+        self.max_open_seconds = float(os.getenv('BREAKER_MAX_OPEN_SECONDS', 3600))
+
+        self._state = CLOSED
+        self.open_seconds = self.base_open_seconds
+        self.opened_at: Optional[float] = None
+        self.outcomes: Deque[Tuple[bool, float]] = deque(maxlen=self.window)
+        # Tempo fino agli header della risposta /scrape (ritardo dell'hedge)
+        self.header_latencies: Deque[float] = deque(maxlen=self.window)
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self.opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            logger.info(f"🟡 Worker {self.name}: circuito half-open, probe in corso")
+        return self._state
+
+    def _open(self, reason: str):
+        self._state = OPEN
+        self.opened_at = time.monotonic()
+        logger.warning(f"🔴 Worker {self.name}: circuito aperto per {self.open_seconds:.0f}s ({reason})")
+
+    def _close(self):
+        self._state = CLOSED
+        self.open_seconds = self.base_open_seconds
+        self.outcomes.clear()
+        logger.info(f"🟢 Worker {self.name}: circuito chiuso")
+
+    def record(self, ok: bool, latency: float):
+        """Registra l'esito di una chiamata e valuta l'apertura del circuito"""
+        self.outcomes.append((ok, latency))
+        if self._state != CLOSED or len(self.outcomes) < self.min_calls:
+            return
+
+        total = len(self.outcomes)
+        errors = sum(1 for success, _ in self.outcomes if not success)
+        slow = sum(1 for success, elapsed in self.outcomes if success and elapsed > self.slow_threshold)
+        if errors / total >= self.error_threshold:
+            self._open(f"{errors}/{total} errori")
+        elif slow / total >= self.slow_ratio:
+            self._open(f"{slow}/{total} chiamate oltre {self.slow_threshold:.0f}s")
+
+    def record_probe(self, ok: bool):
+        """Esito del probe in half-open: richiude o riapre con cooldown raddoppiato"""
+        if ok:
+            self._close()
+        else:
+            self.open_seconds = min(self.max_open_seconds, self.open_seconds * 2)
+            self._open('probe fallito')
+
+    def record_headers(self, latency: float):
+        """Registra il tempo fino agli header di una risposta riuscita"""
+        self.header_latencies.append(latency)
+
+    def headers_p95(self) -> Optional[float]:
+        """95° percentile del tempo fino agli header (None se pochi campioni).
+        Gli stream NDJSON durano molto più degli header: l'hedge usa questo,
+        la durata intera resta per le chiamate lente del circuito"""
+        latencies = sorted(self.header_latencies)
+        if len(latencies) < self.min_calls:
+            return None
+        return latencies[int(0.95 * (len(latencies) - 1))]
@@ -0,0 +1,51 @@
+"""
+Captions - Pulizia delle caption dei deals prima della pubblicazione
+Il pattern dei link viene compilato una sola volta all'avvio a partire dai
+marketplace configurati: una sola passata rimuove i link di tutti i domini,
+qualunque sia il numero di marketplace.
+"""
+
+import re
+from typing import Iterable
+
+# Limite Telegram per le caption di foto
+TELEGRAM_CAPTION_LIMIT = 1024
+
+# Domini dei link corti Amazon, comuni a tutti i marketplace
+SHORT_LINK_DOMAINS = ('amzn.to', 'amzn.eu')
+
+_TRAILING_SPACES = re.compile(r'[ \t]+\n')
+_BLANK_LINES = re.compile(r'\n{3,}')
+
+
+class CaptionSanitizer:
+    """Pulisce le caption con una regex precompilata per tutti i marketplace"""
+
+    def __init__(self, domains: Iterable[str], max_length: int = TELEGRAM_CAPTION_LIMIT):
+        self.max_length = max_length
+        self.domains = sorted(set(domains) | set(SHORT_LINK_DOMAINS), key=len, reverse=True)
+        hosts = '|'.join(re.escape(domain) for domain in self.domains)
+        # Il pattern inizia con lo schema letterale: il motore regex salta
+        # direttamente alle occorrenze di "http" invece di provare ogni carattere
+        self._links = re.compile(rf'https?://(?:www\.)?(?:{hosts})/\S+')
+
+    def clean(self, text: str) -> str:
+        """Rimuove i link, normalizza gli spazi e rispetta il limite di lunghezza"""
+        cleaned = self._links.sub('', text)
+
+        # Le regex di normalizzazione girano solo se servono (controlli in C, quasi gratis)
+        if ' \n' in cleaned or '\t\n' in cleaned:
+            cleaned = _TRAILING_SPACES.sub('\n', cleaned)
+        if '\n\n\n' in cleaned:
+            cleaned = _BLANK_LINES.sub('\n\n', cleaned)
+        cleaned = cleaned.strip()
+
+        if len(cleaned) <= self.max_length:
+            return cleaned
+
+        # Tronca sull'ultimo spazio per non spezzare parole o entità Markdown
+        cut = cleaned[:self.max_length - 1]
+        space = cut.rfind(' ')
+        if space > self.max_length // 2:
+            cut = cut[:space]
+        return cut.rstrip() + '…'
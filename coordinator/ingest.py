@@ -0,0 +1,134 @@
+"""
+Ingest - Endpoint HTTP del coordinatore per il push dei deals dai worker
+I worker consegnano ogni deal appena parsato; il coordinatore lo accoda
+subito sul canale di destinazione e risponde con l'elenco degli ack.
+/health e le metriche Prometheus (/metrics) stanno su un listener a parte
+(create_status_app), raggiungibile da Prometheus anche con /ingest in locale.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, List
+
+from aiohttp import web
+
+from metrics import render as render_metrics
+
+if TYPE_CHECKING:
+    from main import DealCoordinator
+
+logger = logging.getLogger(__name__)
+
+
+class RecentIds:
+    """Insieme limitato di deal_id già accettati, per rendere idempotenti i retry"""
+
+    def __init__(self, max_size: int = 10000, ttl: float = 6 * 3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._seen: 'OrderedDict[str, float]' = OrderedDict()
+
+    def _expire(self, now: float):
+        while self._seen:
+            deal_id, seen_at = next(iter(self._seen.items()))
+            if now - seen_at < self.ttl and len(self._seen) <= self.max_size:
+                break
+            self._seen.popitem(last=False)
+
+    def add(self, deal_id: str) -> bool:
+        """Registra un deal_id; False se era già stato visto"""
+        now = time.monotonic()
+        self._expire(now)
+        if deal_id in self._seen:
+            return False
+        self._seen[deal_id] = now
+        return True
+
+    def discard(self, deal_id: str):
+        """Dimentica un deal_id (commit fallito: il retry deve poter rientrare)"""
+        self._seen.pop(deal_id, None)
+
+
+def deal_key(deal: Dict) -> str:
+    """Identificativo del deal: quello del worker, altrimenti paese + ASIN"""
+    return deal.get('deal_id') or f"{deal.get('country')}:{deal.get('asin')}"
+
+
+def create_ingest_app(coordinator: 'DealCoordinator') -> web.Application:
+    """Crea l'app aiohttp con /ingest"""
+    token = os.getenv('INGEST_TOKEN', '')
+
+    async def ingest(request: web.Request) -> web.Response:
+        if token and request.headers.get('X-Ingest-Token') != token:
+            return web.json_response({'error': 'unauthorized'}, status=401)
+
+        # Shutdown in corso: il worker riproverà o terrà i deals in backlog
+        if coordinator.stopping.is_set():
+            return web.json_response({'error': 'shutdown in corso'}, status=503)
+
+        try:
+            payload = await request.json()
+        except ValueError:
+            return web.json_response({'error': 'JSON non valido'}, status=400)
+
+        deals: List[Dict] = payload if isinstance(payload, list) else [payload]
+        if not all(isinstance(deal, dict) for deal in deals):
+            return web.json_response({'error': 'ogni deal deve essere un oggetto JSON'}, status=400)
+        acked, rejected, deferred, commits = [], [], [], []
+
+        for deal in deals:
+            deal_id = deal_key(deal)
+            worker_config = coordinator.workers.get(deal.get('country'))
+            if not worker_config or not deal.get('asin'):
+                logger.warning(f"⚠️ Deal push rifiutato: {deal_id}")
+                rejected.append(deal_id)
+                continue
+
+            # Worker in lease a un'altra replica: il deal arriverà al suo polling
+            if not coordinator.owns_worker(deal['country']):
+                deferred.append(deal_id)
+                continue
+
+            # Un retry del worker per un deal già accettato riceve comunque l'ack
+            commit = coordinator.accept_deal(deal['country'], deal)
+            if commit:
+                commits.append(commit)
+                logger.info(f"📨 Deal push ricevuto: {deal_id}")
+            acked.append(deal_id)
+
+        # L'ack parte solo quando i deals sono su disco in outbox
+        try:
+            await asyncio.gather(*commits)
+        except Exception as e:
+            logger.error(f"❌ Deals push non salvati in outbox: {e}")
+            return web.json_response({'error': 'outbox non disponibile'}, status=503)
+
+        return web.json_response({'acked': acked, 'rejected': rejected, 'deferred': deferred}, status=202)
+
+    app = web.Application()
+    app.router.add_post('/ingest', ingest)
+    return app
+
+
+def create_status_app(coordinator: 'DealCoordinator') -> web.Application:
+    """Crea l'app aiohttp con /health e /metrics (sola lettura, senza token)"""
+
+    async def health(request: web.Request) -> web.Response:
+        return web.json_response({
+            'status': 'healthy',
+            'workers': list(coordinator.workers.keys()),
+            'owned_workers': coordinator.owned_workers(),
+            'pending': coordinator.publisher.pending
+        })
+
+    async def metrics(request: web.Request) -> web.Response:
+        body, content_type = render_metrics()
+        return web.Response(body=body, headers={'Content-Type': content_type})
+
+    app = web.Application()
+    app.router.add_get('/health', health)
+    app.router.add_get('/metrics', metrics)
+    return app
@@ -0,0 +1,253 @@
+"""
+Leases - Ripartizione dei worker tra più repliche del coordinatore
+Ogni replica si registra come membro con un heartbeat e prende in lease
+i worker che le spettano: con worker e membri vivi in ordine, il worker
+i-esimo va al membro i mod N, così tutte le repliche calcolano la stessa
+ripartizione. Solo chi ha il lease di un worker lo interroga e ne accetta
+i deals in push, quindi due repliche non pubblicano mai lo stesso deal.
+Se una replica muore, heartbeat e lease scadono e i worker passano alle altre.
+
+Backend: LEASE_BACKEND=sqlite:///percorso/leases.db (file condiviso tra
+repliche sullo stesso host o volume). Altri store (Redis, Postgres, ...)
+si aggiungono con register_backend().
+
+Ogni replica ha un COORDINATOR_ID stabile (obbligatorio) e la propria outbox
+(coordinator_outbox_<id>.db) nella cartella condivisa accanto al file dei
+lease (o OUTBOX_DIR), protetta dal lease outbox:<id>. Se l'heartbeat di una
+replica scade, la prima replica viva che prende il lease della sua outbox
+ne sposta i deals in sospeso nella propria e li pubblica; se la replica
+riparte, riprende la sua outbox solo quando il lease torna libero.
+"""
+
+import os
+import time
+import uuid
+import socket
+import sqlite3
+import asyncio
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class LeaseBackend(ABC):
+    """Interfaccia di uno store di lease condiviso (operazioni atomiche e sincrone)"""
+
+    @abstractmethod
+    def heartbeat(self, owner: str, ttl: float):
+        """Registra o rinnova la presenza di una replica"""
+
+    @abstractmethod
+    def members(self) -> List[str]:
+        """Repliche con heartbeat non scaduto"""
+
+    @abstractmethod
+    def acquire(self, key: str, owner: str, ttl: float) -> bool:
+        """Prende o rinnova il lease se libero, scaduto o già proprio"""
+
+    @abstractmethod
+    def release(self, key: str, owner: str):
+        """Rilascia il lease se appartiene a owner"""
+
+    @abstractmethod
+    def leave(self, owner: str):
+        """Rimuove la replica e tutti i suoi lease"""
+
+    def close(self):
+        pass
+
+
+class SQLiteLeaseBackend(LeaseBackend):
+    """Lease su un file SQLite condiviso: ogni operazione è una transazione IMMEDIATE"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)'
+        )
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS members (owner TEXT PRIMARY KEY, expires_at REAL NOT NULL)'
+        )
+
+    def _transaction(self, statements: Callable[[sqlite3.Connection], object]):
+        with self._lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                result = statements(self.conn)
+                self.conn.execute('COMMIT')
+                return result
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+
+    def heartbeat(self, owner: str, ttl: float):
+        expires_at = time.time() + ttl
+        self._transaction(lambda conn: conn.execute(
+            'INSERT INTO members (owner, expires_at) VALUES (?, ?) '
+            'ON CONFLICT(owner) DO UPDATE SET expires_at = excluded.expires_at',
+            (owner, expires_at)
+        ))
+
+    def members(self) -> List[str]:
+        with self._lock:
+            rows = self.conn.execute(
+                'SELECT owner FROM members WHERE expires_at > ? ORDER BY owner', (time.time(),)
+            ).fetchall()
+        return [owner for owner, in rows]
+
+    def acquire(self, key: str, owner: str, ttl: float) -> bool:
+        now = time.time()
+
+        def statements(conn: sqlite3.Connection) -> bool:
+            cursor = conn.execute(
+                'INSERT INTO leases (key, owner, expires_at) VALUES (?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at '
+                'WHERE leases.owner = excluded.owner OR leases.expires_at <= ?',
+                (key, owner, now + ttl, now)
+            )
+            return cursor.rowcount > 0
+
+        return self._transaction(statements)
+
+    def release(self, key: str, owner: str):
+        self._transaction(lambda conn: conn.execute(
+            'DELETE FROM leases WHERE key = ? AND owner = ?', (key, owner)
+        ))
+
+    def leave(self, owner: str):
+        def statements(conn: sqlite3.Connection):
+            conn.execute('DELETE FROM leases WHERE owner = ?', (owner,))
+            conn.execute('DELETE FROM members WHERE owner = ?', (owner,))
+
+        self._transaction(statements)
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+# Backend disponibili per schema dell'URL LEASE_BACKEND
+BACKENDS: Dict[str, Callable[[str], LeaseBackend]] = {
+    'sqlite': SQLiteLeaseBackend,
+}
+
+
+def register_backend(scheme: str, factory: Callable[[str], LeaseBackend]):
+    """Registra un backend per LEASE_BACKEND=<scheme>://..."""
+    BACKENDS[scheme] = factory
+
+
+def create_backend(url: str) -> LeaseBackend:
+    """Backend da URL: sqlite:///percorso/leases.db (o un percorso semplice)"""
+    scheme, sep, location = url.partition('://')
+    if not sep:
+        return SQLiteLeaseBackend(url)
+    if scheme not in BACKENDS:
+        raise ValueError(f"backend di lease sconosciuto: {scheme}")
+    return BACKENDS[scheme](location)
+
+
+class LeaseManager:
+    """Lease dei worker di questa replica, rinnovati periodicamente"""
+
+    def __init__(self, backend: LeaseBackend, owner: Optional[str] = None):
+        self.backend = backend
+        self.owner = owner or os.getenv('COORDINATOR_ID') or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.ttl = float(os.getenv('LEASE_TTL_SECONDS', 30))
+        self.owned: Set[str] = set()
+        self.members: List[str] = [self.owner]
+
+    @classmethod
+    def from_env(cls) -> Optional['LeaseManager']:
+        """LeaseManager da LEASE_BACKEND; None in modalità singola replica"""
+        url = os.getenv('LEASE_BACKEND', '')
+        if not url:
+            return None
+        if not os.getenv('COORDINATOR_ID'):
+            # Senza id stabile le repliche condividerebbero (o perderebbero) l'outbox
+            raise ValueError("LEASE_BACKEND richiede un COORDINATOR_ID stabile per ogni replica")
+        manager = cls(create_backend(url))
+        logger.info(f"🗝️ Lease attivi su {url} come {manager.owner} (ttl {manager.ttl:.0f}s)")
+        return manager
+
+    @property
+    def member_count(self) -> int:
+        return len(self.members)
+
+    @property
+    def renew_interval(self) -> float:
+        return self.ttl / 3
+
+    def owns(self, key: str) -> bool:
+        return key in self.owned
+
+    def _refresh(self, keys: List[str]) -> Set[str]:
+        # keys ordinate: tutte le repliche devono vedere la stessa sequenza
+        self.backend.heartbeat(self.owner, self.ttl)
+        members = self.backend.members() or [self.owner]
+        self.members = members
+
+        owned = set()
+        for index, key in enumerate(keys):
+            preferred = members[index % len(members)]
+            if preferred != self.owner:
+                # Ribilanciamento: cede il worker alla replica che lo deve avere
+                if key in self.owned:
+                    self.backend.release(key, self.owner)
+                continue
+            if self.backend.acquire(key, self.owner, self.ttl):
+                owned.add(key)
+        for key in self.owned - set(keys):
+            # Worker rimosso dal manifest
+            self.backend.release(key, self.owner)
+        return owned
+
+    async def refresh(self, keys: Iterable[str]) -> Set[str]:
+        """Heartbeat, poi acquisisce/rinnova i worker assegnati a questa replica"""
+        keys = sorted(keys)
+        try:
+            owned = await asyncio.to_thread(self._refresh, keys)
+        except Exception as e:
+            # Store irraggiungibile: senza rinnovo i lease scadono, meglio fermarsi
+            # che rischiare doppie pubblicazioni
+            logger.error(f"❌ Rinnovo lease fallito: {e}")
+            owned = set()
+
+        gained, lost = owned - self.owned, self.owned - owned
+        if gained or lost:
+            logger.info(
+                f"🗝️ Lease: +{sorted(gained)} -{sorted(lost)} → {sorted(owned)} "
+                f"({self.member_count} repliche)"
+            )
+        self.owned = owned
+        return owned
+
+    async def hold(self, key: str) -> bool:
+        """Prende o rinnova un lease fuori dalla ripartizione dei worker (es. un'outbox)"""
+        try:
+            return await asyncio.to_thread(self.backend.acquire, key, self.owner, self.ttl)
+        except Exception as e:
+            logger.error(f"❌ Lease {key} non acquisito: {e}")
+            return False
+
+    async def release(self, key: str):
+        """Rilascia un lease preso con hold()"""
+        try:
+            await asyncio.to_thread(self.backend.release, key, self.owner)
+        except Exception as e:
+            logger.error(f"❌ Rilascio lease {key} fallito: {e}")
+
+    async def close(self):
+        """Rilascia subito i lease: le altre repliche subentrano senza attendere il ttl"""
+        try:
+            await asyncio.to_thread(self.backend.leave, self.owner)
+        except Exception as e:
+            logger.error(f"❌ Rilascio lease fallito: {e}")
+        self.owned = set()
+        self.backend.close()
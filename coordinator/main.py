@@ -5,17 +5,42 @@ Gestisce la schedulazione e coordina i worker per scraping deals Amazon
 """
 
 import os
+import sys
+import json
+import signal
+import time
+import uuid
 import logging
+import ipaddress
 import asyncio
-import requests
+import aiohttp
+from aiohttp import web
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import AsyncIterator, List, Dict, Optional
 from urllib.parse import quote
 from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.error import TelegramError
+from telegram.error import BadRequest, TelegramError
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.tracing import TRACEPARENT_HEADER, Span, Tracer
+
+from breaker import CircuitBreaker, HALF_OPEN, OPEN
+from captions import CaptionSanitizer
+from ingest import RecentIds, create_ingest_app, create_status_app, deal_key
+from leases import LeaseManager
+from media_cache import MediaCache
+from metrics import (
+    CYCLE_SECONDS, DEALS_FAILED, DEALS_POSTED, DEALS_RECEIVED, DEALS_SKIPPED,
+    SEND_PHOTO_SECONDS, WORKER_REQUEST_SECONDS
+)
+from outbox import Outbox, replica_name, replica_outboxes
+from publisher import Publisher
+from registry import WorkerRegistry
+from retry import TelegramRetry
+from scheduling import AdaptivePoller, CycleGuard
+
 # Configurazione logging
 logging.basicConfig(
     level=logging.INFO,
@@ -23,82 +48,487 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Dominio Amazon per ogni marketplace
+MARKETPLACE_DOMAINS = {
+    'UK': 'amazon.co.uk',
+    'IT': 'amazon.it'
+}
+
+
+def is_loopback(host: str) -> bool:
+    """True se l'indirizzo di ascolto è raggiungibile solo dalla macchina locale"""
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
 class DealCoordinator:
     def __init__(self):
         self.bot_token = os.getenv('BOT_TOKEN')
         self.bot = Bot(token=self.bot_token)
+        self.telegram_retry = TelegramRetry()
+        
+        # Deadline di default per ogni worker (sovrascrivibile per worker)
+        self.worker_timeout = float(os.getenv('WORKER_TIMEOUT', 30))
+        
+        # Circuit breaker per worker ed hedging opzionale delle chiamate lente
+        # (WORKER_HEDGE=1; la copia parte solo se il worker ha uno slot libero)
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        # Scrape contemporanei per worker, al massimo 'concurrency' della sua voce
+        self.scrape_slots: Dict[str, asyncio.Semaphore] = {}
+        self.hedge_enabled = os.getenv('WORKER_HEDGE', '0') == '1'
+        self.hedge_min_delay = float(os.getenv('WORKER_HEDGE_MIN_SECONDS', 1))
+        self.probe_timeout = float(os.getenv('WORKER_PROBE_TIMEOUT', 3))
+        
+        # Worker dal manifest (WORKERS_MANIFEST) o dalle variabili d'ambiente
+        self.registry = WorkerRegistry({
+            'timeout': self.worker_timeout,
+            'concurrency': 2 if self.hedge_enabled else 1,
+        })
+        self.workers = self.registry.load()
+        self.registry_reload_seconds = float(os.getenv('REGISTRY_RELOAD_SECONDS', 30))
+        
+        # Più repliche: ognuna interroga solo i worker di cui ha il lease
+        self.leases = LeaseManager.from_env()
+        
+        # Pool HTTP verso i worker: creato in run(), chiuso allo shutdown
+        self.http_session: Optional[aiohttp.ClientSession] = None
+        self.http_pool_limit = int(os.getenv('WORKER_HTTP_POOL_LIMIT', 100))
+        self.http_pool_limit_per_host = int(os.getenv('WORKER_HTTP_POOL_PER_HOST', 4))
+        self.http_keepalive = float(os.getenv('WORKER_HTTP_KEEPALIVE', 60))
+        self.http_connect_timeout = float(os.getenv('WORKER_CONNECT_TIMEOUT', 5))
+        self.http_read_timeout = float(os.getenv('WORKER_READ_TIMEOUT', 30))
+        
+        # Code di pubblicazione per canale (rate limit Telegram per chat e globale)
+        self.publisher = Publisher(self.publish_deal)
+        
+        # Outbox persistente: i deals sono su disco prima di essere pubblicati
+        self.outbox = Outbox(self.on_outbox_commit)
+        self.outbox_resumed = False
         
-        # Worker endpoints
-        self.workers = {}
-        
-        # Worker UK
-        worker_uk_url = os.getenv('WORKER_UK_URL', 'http://127.0.0.1:8001')
-        if worker_uk_url:
-            self.workers['UK'] = {
-                'url': worker_uk_url,
-                'channel': os.getenv('UK_CHANNEL', '@DealScoutUKBot'),
-                'channel_id': int(os.getenv('UK_CHANNEL_ID', -1001232723285)),
-                'affiliate_tag': 'ukbestdeal02-21'
-            }
-            logger.info(f"Worker UK configurato: {worker_uk_url}")
-        
-        # Worker IT (opzionale)
-        worker_it_url = os.getenv('WORKER_IT_URL', 'http://127.0.0.1:8002')
-        if worker_it_url:
-            self.workers['IT'] = {
-                'url': worker_it_url,
-                'channel': os.getenv('IT_CHANNEL', '@AmazonITDealScout'),
-                'channel_id': int(os.getenv('IT_CHANNEL_ID', -1001080585126)),
-                'affiliate_tag': 'srzone00-21'
-            }
-            logger.info(f"Worker IT configurato: {worker_it_url}")
+        # Push dai worker: endpoint /ingest, il polling resta come riconciliazione.
+        # Solo in locale di default: esposto su altre interfacce richiede INGEST_TOKEN
+        self.ingest_host = os.getenv('COORDINATOR_HOST', '127.0.0.1')
+        self.ingest_port = int(os.getenv('COORDINATOR_PORT', 8000))
+        self.ingest_runner: Optional[web.AppRunner] = None
+        
+        # /health e /metrics su un listener proprio, per Prometheus e healthcheck:
+        # sola lettura, indipendente dalla regola loopback/token di /ingest
+        self.status_host = os.getenv('COORDINATOR_METRICS_HOST', '0.0.0.0')
+        self.status_port = int(os.getenv('COORDINATOR_METRICS_PORT', 8010))
+        self.status_runner: Optional[web.AppRunner] = None
+        self.reconcile_minutes = int(os.getenv('RECONCILE_INTERVAL_MINUTES', 15))
+        self.recent_deals = RecentIds()
+        
+        # Polling per worker con intervallo adattivo: il tick dello scheduler
+        # interroga solo i worker scaduti, al massimo ogni RECONCILE_INTERVAL_MINUTES
+        self.poll_tick_seconds = float(os.getenv('POLL_TICK_SECONDS', 15))
+        self.poller = AdaptivePoller(self.reconcile_minutes * 60)
+        
+        # Un solo ciclo alla volta, con finestra di fetch adattiva
+        self.cycle_guard = CycleGuard(self.poller.min_interval)
+        
+        # Pulizia caption compilata una volta sola dai marketplace configurati
+        self.caption_sanitizer = CaptionSanitizer(self.worker_domains())
+        
+        # Cache persistente ASIN -> file_id delle foto già caricate
+        self.media_cache = MediaCache()
+        
+        # Shutdown graduale (SIGTERM/SIGINT): niente nuovi cicli né push,
+        # pubblicazione fino alla deadline, il resto resta in outbox
+        self.stopping = asyncio.Event()
+        self.shutdown_timeout = float(os.getenv('SHUTDOWN_TIMEOUT', 25))
+        
+        # Span di ogni fase, correlati ai worker tramite traceparent
+        self.tracer = Tracer.from_env('coordinator')
         
         self.scheduler = AsyncIOScheduler()
         
-    async def call_worker(self, country: str, worker_config: Dict) -> List[Dict]:
-        """Chiama un worker specifico e recupera i deals"""
+        for country in self.workers:
+            self.configure_worker(country)
+    
+    def worker_domains(self) -> List[str]:
+        """Domini Amazon dei worker configurati"""
+        return sorted({
+            worker_config.get('domain') or MARKETPLACE_DOMAINS.get(country, 'amazon.com')
+            for country, worker_config in self.workers.items()
+        })
+    
+    def owns_worker(self, country: str) -> bool:
+        """True se questa replica gestisce il worker (sempre, senza lease)"""
+        return self.leases is None or self.leases.owns(country)
+    
+    def owned_workers(self) -> List[str]:
+        """Worker gestiti da questa replica"""
+        return [country for country in self.workers if self.owns_worker(country)]
+    
+    async def refresh_leases(self):
+        """Rinnova i lease e adegua la quota del limite globale di pubblicazione"""
+        await self.leases.refresh(self.workers.keys())
+        self.publisher.set_global_share(self.leases.member_count)
+        await self.refresh_outboxes()
+    
+    async def refresh_outboxes(self):
+        """Lease sulla propria outbox e presa in carico di quelle delle repliche morte"""
+        own = replica_name(self.leases.owner)
+        if await self.leases.hold(f"outbox:{own}") and not self.outbox_resumed:
+            # Ripresa solo col lease: un'altra replica potrebbe star spostando questi deals
+            self.outbox_resumed = True
+            await self.outbox.resume()
+        
+        alive = {replica_name(member) for member in self.leases.members}
+        for replica, path in replica_outboxes().items():
+            if replica in alive or os.path.abspath(path) == os.path.abspath(self.outbox.path):
+                continue
+            key = f"outbox:{replica}"
+            if not await self.leases.hold(key):
+                continue
+            try:
+                await self.outbox.adopt(path)
+            except Exception as e:
+                logger.error(f"❌ Outbox della replica {replica} non presa in carico: {e}")
+            finally:
+                await self.leases.release(key)
+    
+    def configure_worker(self, country: str):
+        """Applica i limiti propri del worker: polling e ritmo di pubblicazione"""
+        worker_config = self.workers[country]
+        self.poller.configure(
+            country,
+            worker_config.get('poll_min_seconds'),
+            worker_config.get('poll_max_seconds')
+        )
+        self.publisher.configure(
+            worker_config.get('channel_id') or worker_config['channel'],
+            worker_config.get('publish_rate'),
+            worker_config.get('publish_per_minute')
+        )
+    
+    async def reload_workers(self):
+        """Rilegge il manifest e mette in servizio le modifiche senza riavvio"""
+        changes = self.registry.reload()
+        if changes is None:
+            return
+        added, removed, changed = changes
+        
+        domains_before = self.worker_domains()
+        self.workers = self.registry.workers
+        for country in removed:
+            self.breakers.pop(country, None)
+            self.scrape_slots.pop(country, None)
+            self.poller.forget(country)
+        for country in changed:
+            # Timeout, soglie e concurrency nuovi: breaker e slot ripartono dalla nuova configurazione
+            self.breakers.pop(country, None)
+            self.scrape_slots.pop(country, None)
+        for country in added | changed:
+            self.configure_worker(country)
+        
+        if self.worker_domains() != domains_before:
+            self.caption_sanitizer = CaptionSanitizer(self.worker_domains())
+        
+    def create_http_session(self) -> aiohttp.ClientSession:
+        """Crea il pool HTTP persistente (keep-alive, limiti per host, timeout)"""
+        connector = aiohttp.TCPConnector(
+            limit=self.http_pool_limit,
+            limit_per_host=self.http_pool_limit_per_host,
+            keepalive_timeout=self.http_keepalive
+        )
+        timeout = aiohttp.ClientTimeout(
+            connect=self.http_connect_timeout,
+            sock_read=self.http_read_timeout
+        )
+        logger.info(
+            f"🔌 Pool HTTP worker: limit={self.http_pool_limit}, per_host={self.http_pool_limit_per_host}, "
+            f"keepalive={self.http_keepalive}s, connect={self.http_connect_timeout}s, read={self.http_read_timeout}s"
+        )
+        return aiohttp.ClientSession(connector=connector, timeout=timeout)
+    
+    async def close_http_session(self):
+        """Chiude il pool HTTP verso i worker"""
+        if self.http_session and not self.http_session.closed:
+            await self.http_session.close()
+        self.http_session = None
+    
+    def breaker(self, country: str, worker_config: Dict) -> CircuitBreaker:
+        """Circuit breaker del worker (creato al primo utilizzo)"""
+        breaker = self.breakers.get(country)
+        if breaker is None:
+            slow_threshold = float(os.getenv('WORKER_SLOW_SECONDS', worker_config.get('timeout', self.worker_timeout) / 2))
+            breaker = self.breakers[country] = CircuitBreaker(country, slow_threshold)
+        return breaker
+    
+    def slots(self, country: str, worker_config: Dict) -> asyncio.Semaphore:
+        """Slot per gli scrape contemporanei del worker (creati al primo utilizzo)"""
+        slots = self.scrape_slots.get(country)
+        if slots is None:
+            slots = self.scrape_slots[country] = asyncio.Semaphore(max(1, worker_config['concurrency']))
+        return slots
+    
+    async def probe_worker(self, country: str, worker_config: Dict) -> bool:
+        """Probe leggero (/health) per un worker col circuito half-open"""
+        try:
+            async with self.http_session.get(
+                f"{worker_config['url']}/health",
+                timeout=aiohttp.ClientTimeout(total=self.probe_timeout)
+            ) as response:
+                return response.status == 200
+        except Exception as e:
+            logger.warning(f"Worker {country}: probe fallito - {e}")
+            return False
+    
+    async def worker_available(self, country: str, worker_config: Dict) -> bool:
+        """Controlla il circuit breaker prima di chiamare il worker"""
+        breaker = self.breaker(country, worker_config)
+        state = breaker.state
+        if state == OPEN:
+            logger.warning(f"⏭️ Worker {country} saltato: circuito aperto")
+            return False
+        if state == HALF_OPEN:
+            breaker.record_probe(await self.probe_worker(country, worker_config))
+            return breaker.state != OPEN
+        return True
+    
+    def request_scrape(self, country: str, worker_config: Dict, scrape_id: str, traceparent: str):
+        """Richiesta /scrape in streaming; X-Scrape-Id rende idempotenti gli hedge"""
+        return self.http_session.get(
+            f"{worker_config['url']}/scrape",
+            params={'stream': '1', 'limit': str(self.cycle_guard.fetch_window)},
+            headers={'X-Scrape-Id': scrape_id, TRACEPARENT_HEADER: traceparent},
+            timeout=aiohttp.ClientTimeout(
+                total=worker_config.get('timeout', self.worker_timeout),
+                connect=self.http_connect_timeout,
+                sock_read=self.http_read_timeout
+            )
+        )
+    
+    async def open_scrape(self, country: str, worker_config: Dict, span: Span) -> aiohttp.ClientResponse:
+        """Apre lo stream /scrape; con WORKER_HEDGE=1, se gli header non arrivano entro
+        il p95 del worker (almeno WORKER_HEDGE_MIN_SECONDS) parte una richiesta hedge
+        su un secondo slot del worker (se libero).
+        Vince la prima risposta 200. La copia ha lo stesso X-Scrape-Id: se la prima
+        richiesta è arrivata al worker la copia riceve 409 e si resta sulla prima,
+        perché un secondo scrape consumerebbe backlog e messaggi già assegnati.
+        L'hedge copre quindi la richiesta persa o bloccata prima del worker
+        (connessione, proxy), non lo scrape lento."""
+        scrape_id = uuid.uuid4().hex
+        span.set(scrape_id=scrape_id)
+        breaker = self.breaker(country, worker_config)
+        requested = time.monotonic()
+        
+        def on_headers(request: asyncio.Future):
+            if not request.cancelled() and request.exception() is None and request.result().status == 200:
+                breaker.record_headers(time.monotonic() - requested)
+        
+        first = asyncio.ensure_future(self.request_scrape(country, worker_config, scrape_id, span.traceparent))
+        first.add_done_callback(on_headers)
+        
+        headers_p95 = breaker.headers_p95() if self.hedge_enabled else None
+        if headers_p95 is None:
+            return await first
+        hedge_after = max(headers_p95, self.hedge_min_delay)
+        
+        done, _ = await asyncio.wait({first}, timeout=hedge_after)
+        if done:
+            return first.result()
+        
+        slots = self.slots(country, worker_config)
+        if slots.locked():
+            # Worker già al limite di concurrency: niente copia
+            return await first
+        
+        async with slots:
+            return await self.race_hedge(country, worker_config, span, scrape_id, first, hedge_after)
+    
+    async def race_hedge(
+        self, country: str, worker_config: Dict, span: Span, scrape_id: str,
+        first: asyncio.Future, hedge_after: float
+    ) -> aiohttp.ClientResponse:
+        """Richiesta hedge in gara con la prima: resta aperta solo la risposta vincente"""
+        logger.info(f"🪃 Worker {country}: header oltre {hedge_after:.1f}s, richiesta hedge")
+        span.set(hedged=True)
+        tasks = {first, asyncio.ensure_future(self.request_scrape(country, worker_config, scrape_id, span.traceparent))}
+        winner = None
+        error: Optional[BaseException] = None
+        while tasks and winner is None:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    error = task.exception()
+                elif winner is None and (task.result().status == 200 or not tasks):
+                    winner = task.result()
+                else:
+                    task.result().release()
+        
+        for task in tasks:
+            task.cancel()
+        if winner is None:
+            raise error
+        return winner
+    
+    async def call_worker(self, country: str, worker_config: Dict, parent: Optional[Span] = None) -> AsyncIterator[Dict]:
+        """Chiama un worker specifico e produce i deals man mano che arrivano (NDJSON)"""
+        timeout = worker_config.get('timeout', self.worker_timeout)
+        breaker = self.breaker(country, worker_config)
+        span = self.tracer.span('coordinator.scrape_request', parent, country=country)
+        started = time.monotonic()
+        ok = False
+        deals_found = 0
         try:
             logger.info(f"Chiamando worker {country}: {worker_config['url']}")
             
-            response = requests.get(
-                f"{worker_config['url']}/scrape",
-                timeout=30
-            )
+            async with self.slots(country, worker_config), \
+                    await self.open_scrape(country, worker_config, span) as response:
+                span.set(status=response.status)
+                if response.status != 200:
+                    logger.error(f"Worker {country} errore HTTP: {response.status}")
+                    return
+                
+                if response.content_type == 'application/x-ndjson':
+                    async for line in response.content:
+                        line = line.strip()
+                        if not line:
+                            continue
+                        deals_found += 1
+                        yield json.loads(line)
+                else:
+                    # Worker non aggiornato: risposta JSON completa
+                    for deal in await response.json():
+                        deals_found += 1
+                        yield deal
             
-            if response.status_code == 200:
-                deals = response.json()
-                logger.info(f"Worker {country}: {len(deals)} deals trovati")
-                return deals
-            else:
-                logger.error(f"Worker {country} errore HTTP: {response.status_code}")
-                return []
+            ok = True
+            logger.info(f"Worker {country}: {deals_found} deals trovati")
                 
-        except requests.exceptions.Timeout:
-            logger.error(f"Worker {country}: timeout dopo 30s")
-            return []
-        except requests.exceptions.ConnectionError as e:
+        except asyncio.TimeoutError as e:
+            span.fail(e)
+            logger.error(f"Worker {country}: timeout dopo {timeout}s ({deals_found} deals ricevuti)")
+        except aiohttp.ClientConnectionError as e:
+            span.fail(e)
             logger.error(f"Worker {country}: connessione fallita - {e}")
-            return []
         except Exception as e:
+            span.fail(e)
             logger.error(f"Worker {country}: errore generico - {e}")
             import traceback
             logger.error(traceback.format_exc())
-            return []
-            return []
-        except Exception as e:
-            logger.error(f"Worker {country}: errore generico: {e}")
-            return []
+        finally:
+            span.end(deals=deals_found)
+            # Durata dell'intero stream: gli header NDJSON arrivano subito
+            elapsed = time.monotonic() - started
+            breaker.record(ok, elapsed)
+            WORKER_REQUEST_SECONDS.labels(country, 'ok' if ok else 'error').observe(elapsed)
+    
+    def accept_deal(self, country: str, deal: Dict) -> Optional[asyncio.Future]:
+        """Scrive un deal in outbox, ignorando quelli già ricevuti (push o polling).
+        Il future si risolve quando il deal è su disco."""
+        deal_id = deal_key(deal)
+        if not self.recent_deals.add(deal_id):
+            DEALS_SKIPPED.labels(country).inc()
+            return None
+        DEALS_RECEIVED.labels(country).inc()
+        future = self.outbox.add(deal_id, deal, country)
+        future.add_done_callback(lambda commit: self.on_deal_committed(deal_id, commit))
+        return future
+    
+    def on_deal_committed(self, deal_id: str, commit: asyncio.Future):
+        """Commit in outbox fallito: il deal_id esce dai recenti, così il retry
+        del worker (o il prossimo polling) non viene scartato come duplicato"""
+        if commit.cancelled() or commit.exception() is not None:
+            self.recent_deals.discard(deal_id)
+    
+    async def on_outbox_commit(self, rows: List):
+        """Deals appena resi durevoli in outbox: passano alle code di pubblicazione"""
+        for deal, country in rows:
+            worker_config = self.workers.get(country)
+            if not worker_config:
+                logger.warning(f"⚠️ Deal {deal_key(deal)} per worker {country} non configurato")
+                continue
+            self.publisher.submit(deal, worker_config)
+    
+    async def publish_deal(self, deal: Dict, worker_config: Dict) -> bool:
+        """Pubblica un deal dell'outbox: ack se riuscito, altrimenti nuovo tentativo in coda"""
+        deal_id = deal_key(deal)
+        country = deal.get('country', 'unknown')
+        # Lo span del post è figlio del parse_message che ha prodotto il deal
+        with self.tracer.span(
+            'coordinator.post_deal', deal.get('traceparent'),
+            asin=deal.get('asin'), country=country, chat=str(worker_config['channel'])
+        ) as span:
+            posted = await self.post_deal(deal, worker_config)
+            span.set(posted=posted)
+        if posted:
+            self.outbox.ack(deal_id)
+            DEALS_POSTED.labels(country).inc()
+            return True
+        DEALS_FAILED.labels(country).inc()
+        if self.outbox.fail(deal_id):
+            self.publisher.submit(deal, worker_config)
+        return False
+    
+    async def drain_worker(self, country: str, worker_config: Dict, parent: Optional[Span] = None) -> int:
+        """Consuma lo stream di un worker accodando ogni deal appena arriva"""
+        if not await self.worker_available(country, worker_config):
+            return 0
+        
+        commits: Dict[str, asyncio.Future] = {}
+        async for deal in self.call_worker(country, worker_config, parent):
+            commit = self.accept_deal(country, deal)
+            if commit:
+                commits[deal_key(deal)] = commit
+        
+        # Ricevuti sono solo i deals arrivati su disco in outbox
+        results = await asyncio.gather(*commits.values(), return_exceptions=True)
+        failed = [deal_id for deal_id, result in zip(commits, results) if isinstance(result, BaseException)]
+        if failed:
+            logger.error(f"❌ Worker {country}: {len(failed)} deals non salvati in outbox: {', '.join(failed)}")
+        deals_found = len(commits) - len(failed)
+        
+        if not deals_found:
+            logger.warning(f"Nessun deal da worker {country}")
+        return deals_found
+    
+    async def fan_out_workers(self, countries: Optional[List[str]] = None, parent: Optional[Span] = None) -> Dict[str, int]:
+        """Interroga i worker indicati (default tutti) in parallelo, ognuno con la propria deadline"""
+        if countries is None:
+            countries = list(self.workers.keys())
+        if not countries:
+            return {}
+        
+        if self.http_session is None or self.http_session.closed:
+            self.http_session = self.create_http_session()
+        
+        results = await asyncio.gather(
+            *(self.drain_worker(country, self.workers[country], parent) for country in countries),
+            return_exceptions=True
+        )
+        
+        deals_by_country = {}
+        for country, result in zip(countries, results):
+            if isinstance(result, BaseException):
+                logger.error(f"Worker {country}: errore inatteso - {result}")
+                result = 0
+            deals_by_country[country] = result
+        return deals_by_country
     
     def build_affiliate_link(self, asin: str, country: str, affiliate_tag: str) -> str:
         """Costruisce link affiliato Amazon"""
-        domain_map = {
-            'UK': 'amazon.co.uk',
-            'IT': 'amazon.it'
-        }
-        domain = domain_map.get(country, 'amazon.com')
+        worker_config = self.workers.get(country, {})
+        domain = worker_config.get('domain') or MARKETPLACE_DOMAINS.get(country, 'amazon.com')
         return f"https://{domain}/dp/{asin}?tag={affiliate_tag}"
     
-    async def post_deal(self, deal: Dict, worker_config: Dict):
+    async def send_photo(self, chat_id, **kwargs):
+        """send_photo con retry: flood wait rispettati e ritmo della chat adattato"""
+        with SEND_PHOTO_SECONDS.labels(str(chat_id)).time():
+            return await self.telegram_retry.call(
+                lambda: self.bot.send_photo(chat_id=chat_id, **kwargs),
+                rate=self.publisher.rate_control(chat_id),
+                description=f"send_photo su {chat_id}"
+            )
+    
+    async def post_deal(self, deal: Dict, worker_config: Dict) -> bool:
         """Posta un singolo deal sul canale Telegram con immagine"""
         try:
             # Il worker ha già preparato il messaggio con l'URL affiliato corretto
@@ -107,14 +537,10 @@ class DealCoordinator:
             
             if not message_text or not affiliate_url:
                 logger.error(f"Deal {deal.get('asin', 'unknown')} mancante di message_text o affiliate_url")
-                return
+                return False
             
-            # Rimuovi il link dal testo per nasconderlo
-            import re
-            message_text_clean = re.sub(r'https://www\.amazon\.co\.uk/[^\s\n]+', '', message_text)
-            message_text_clean = re.sub(r'https://www\.amazon\.it/[^\s\n]+', '', message_text_clean)
-            message_text_clean = re.sub(r'https://amzn\.(to|eu)/[^\s\n]+', '', message_text_clean)
-            message_text_clean = message_text_clean.strip()
+            # Rimuovi il link dal testo per nasconderlo (una sola passata precompilata)
+            message_text_clean = self.caption_sanitizer.clean(message_text)
             
             # Crea bottoni di sharing
             share_text = f"🔥 Amazon Deal\n🛒 {affiliate_url}"
@@ -136,75 +562,184 @@ class DealCoordinator:
             # Usa channel_id se disponibile, altrimenti channel name
             chat_id = worker_config.get('channel_id') or worker_config['channel']
             
-            # Invia come foto usando l'URL Amazon per scaricare l'immagine
+            # Invia come foto: file_id in cache se la foto è già stata caricata,
+            # altrimenti l'URL Amazon da cui Telegram scarica l'immagine.
             # Il testo (caption) non contiene il link, solo nei bottoni
-            await self.bot.send_photo(
-                chat_id=chat_id,
-                photo=affiliate_url,
-                caption=message_text_clean,
-                parse_mode='Markdown',
-                reply_markup=reply_markup
-            )
+            asin = deal['asin']
+            file_id = await self.media_cache.get(asin)
+            try:
+                message = await self.send_photo(
+                    chat_id,
+                    photo=file_id or affiliate_url,
+                    caption=message_text_clean,
+                    parse_mode='Markdown',
+                    reply_markup=reply_markup
+                )
+            except BadRequest as e:
+                if not file_id:
+                    raise
+                # file_id rifiutato da Telegram: invalida e riprova con l'URL
+                logger.warning(f"⚠️ file_id in cache rifiutato per {asin}: {e}")
+                await self.media_cache.invalidate(asin)
+                file_id = None
+                message = await self.send_photo(
+                    chat_id,
+                    photo=affiliate_url,
+                    caption=message_text_clean,
+                    parse_mode='Markdown',
+                    reply_markup=reply_markup
+                )
+            
+            if not file_id and message.photo:
+                await self.media_cache.put(asin, message.photo[-1].file_id)
             
             logger.info(f"Deal postato con immagine: {deal['asin']} su {worker_config['channel']}")
+            return True
             
         except TelegramError as e:
             logger.error(f"Errore Telegram posting deal {deal.get('asin', 'unknown')}: {e}")
         except Exception as e:
             logger.error(f"Errore generico posting deal {deal.get('asin', 'unknown')}: {e}")
+        return False
     
     async def process_deals(self):
-        """Processo principale: chiama tutti i worker e posta i deals"""
-        logger.info("🚀 Avvio ciclo di processing deals")
+        """Processo principale: chiama i worker scaduti e posta i deals"""
+        if self.stopping.is_set():
+            return
+        due = self.poller.due(self.owned_workers())
+        if not due:
+            return
+        if not self.cycle_guard.try_start():
+            return
         
+        span = self.tracer.span('coordinator.cycle', workers=due, fetch_window=self.cycle_guard.fetch_window)
         total_deals = 0
-        
-        for country, worker_config in self.workers.items():
-            logger.info(f"Processing worker {country}...")
+        try:
+            logger.info(
+                f"🚀 Avvio ciclo di processing deals per {', '.join(due)} "
+                f"(finestra {self.cycle_guard.fetch_window})"
+            )
             
-            # Chiama worker
-            deals = await self.call_worker(country, worker_config)
+            posted_before = self.publisher.posted
             
-            if not deals:
-                logger.warning(f"Nessun deal da worker {country}")
-                continue
+            # Tutti i worker in parallelo: ogni deal va in coda sul suo canale appena
+            # arriva dallo stream, quindi la pubblicazione parte col primo messaggio parsato
+            deals_by_country = await self.fan_out_workers(due, span)
+            logger.info(f"📥 Deals ricevuti: {deals_by_country}")
+            
+            # Il ritmo dei nuovi deals decide quando interrogare di nuovo ogni worker
+            for country, count in deals_by_country.items():
+                self.poller.record(country, count)
             
-            # Posta ogni deal
-            for deal in deals:
-                try:
-                    await self.post_deal(deal, worker_config)
-                    total_deals += 1
-                    
-                    # Pausa tra post per evitare rate limiting
-                    await asyncio.sleep(2)
-                    
-                except Exception as e:
-                    logger.error(f"Errore processing deal {deal.get('asin', 'unknown')}: {e}")
-                    continue
-        
-        logger.info(f"✅ Ciclo completato. {total_deals} deals processati")
+            # Commit degli ultimi deals ricevuti, poi attesa delle code
+            await self.outbox.flush()
+            await self.publisher.join()
+            total_deals = self.publisher.posted - posted_before
+        finally:
+            duration = self.cycle_guard.finish()
+            CYCLE_SECONDS.observe(duration)
+            span.end(posted=total_deals)
+        
+        logger.info(f"✅ Ciclo completato in {duration:.0f}s. {total_deals} deals processati")
     
     def start_scheduler(self):
-        """Avvia lo scheduler per esecuzione ogni 15 minuti"""
+        """Avvia lo scheduler: un tick breve che interroga solo i worker scaduti"""
         self.scheduler.add_job(
             self.process_deals,
-            trigger=IntervalTrigger(minutes=15),
+            trigger=IntervalTrigger(seconds=self.poll_tick_seconds),
             id='deal_processing',
-            name='Process Deals Every 15 Minutes',
-            replace_existing=True
+            name=f'Process Deals Tick Every {self.poll_tick_seconds:.0f} Seconds',
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+            misfire_grace_time=int(self.poll_tick_seconds)
         )
         
+        # Heartbeat e rinnovo dei lease (ttl/3: un rinnovo perso non fa scadere nulla)
+        if self.leases:
+            self.scheduler.add_job(
+                self.refresh_leases,
+                trigger=IntervalTrigger(seconds=self.leases.renew_interval),
+                id='lease_refresh',
+                name='Refresh Worker Leases',
+                replace_existing=True,
+                max_instances=1,
+                coalesce=True
+            )
+        
+        # Worker aggiunti o rimossi dal manifest entrano in servizio senza riavvio
+        if self.registry.path:
+            self.scheduler.add_job(
+                self.reload_workers,
+                trigger=IntervalTrigger(seconds=self.registry_reload_seconds),
+                id='registry_reload',
+                name='Reload Worker Manifest',
+                replace_existing=True,
+                max_instances=1,
+                coalesce=True
+            )
+        
         # Esecuzione immediata al primo avvio
         self.scheduler.add_job(
             self.process_deals,
             trigger='date',
             run_date=datetime.now(),
             id='initial_run',
-            name='Initial Deal Processing'
+            name='Initial Deal Processing',
+            max_instances=1
         )
         
         self.scheduler.start()
-        logger.info("📅 Scheduler avviato - processing ogni 15 minuti")
+        logger.info(
+            f"📅 Scheduler avviato - polling adattivo tra {self.poller.min_interval:.0f}s "
+            f"e {self.poller.max_interval:.0f}s per worker"
+        )
+    
+    async def start_ingest_server(self):
+        """Avvia il server HTTP per il push dei deals (/ingest)"""
+        if not is_loopback(self.ingest_host) and not os.getenv('INGEST_TOKEN'):
+            # Chiunque raggiunga la porta potrebbe pubblicare sui canali
+            raise RuntimeError(
+                f"/ingest su {self.ingest_host} senza INGEST_TOKEN: imposta il token o COORDINATOR_HOST=127.0.0.1"
+            )
+        self.ingest_runner = web.AppRunner(create_ingest_app(self))
+        await self.ingest_runner.setup()
+        site = web.TCPSite(self.ingest_runner, self.ingest_host, self.ingest_port)
+        await site.start()
+        logger.info(f"📨 Ingest push in ascolto su {self.ingest_host}:{self.ingest_port}/ingest")
+    
+    async def start_status_server(self):
+        """Avvia il server HTTP di /health e /metrics"""
+        self.status_runner = web.AppRunner(create_status_app(self))
+        await self.status_runner.setup()
+        site = web.TCPSite(self.status_runner, self.status_host, self.status_port)
+        await site.start()
+        logger.info(f"📈 /health e /metrics in ascolto su {self.status_host}:{self.status_port}")
+    
+    async def drain(self):
+        """Shutdown graduale: chiude i cicli e pubblica quanto possibile entro SHUTDOWN_TIMEOUT.
+        I deals non pubblicati restano in outbox e ripartono al prossimo avvio."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.shutdown_timeout
+        self.stopping.set()
+        
+        # Nessun nuovo ciclo; /ingest risponde 503 e i worker tengono i deals in backlog
+        if self.scheduler.running:
+            self.scheduler.shutdown(wait=False)
+        
+        # Il ciclo in corso finisce di leggere dai worker e di pubblicare
+        while self.cycle_guard.running and loop.time() < deadline:
+            await asyncio.sleep(0.2)
+        
+        await self.outbox.flush()
+        try:
+            await asyncio.wait_for(self.publisher.join(), max(0.0, deadline - loop.time()))
+            logger.info("✅ Drain completato: code di pubblicazione vuote")
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"⏱️ Deadline di shutdown ({self.shutdown_timeout:.0f}s) raggiunta: "
+                f"{self.publisher.pending} deals ancora in coda restano in outbox per il prossimo avvio"
+            )
     
     async def run(self):
         """Avvia il coordinatore"""
@@ -212,22 +747,57 @@ class DealCoordinator:
         
         # Test connessione bot
         try:
-            bot_info = await self.bot.get_me()
+            bot_info = await self.telegram_retry.call(self.bot.get_me, description='get_me')
             logger.info(f"Bot connesso: @{bot_info.username}")
         except Exception as e:
             logger.error(f"Errore connessione bot: {e}")
             return
         
+        # Pool HTTP persistente verso i worker
+        self.http_session = self.create_http_session()
+        
+        # Lease dei worker prima del primo ciclo; con più repliche l'outbox
+        # viene ripresa quando se ne ha il lease
+        if self.leases:
+            await self.refresh_leases()
+        else:
+            # Ripresa dei deals rimasti in outbox, senza richiamare i worker
+            await self.outbox.resume()
+        
+        # Endpoint /ingest per il push dai worker
+        await self.start_ingest_server()
+        
+        # /health e /metrics per monitoring
+        await self.start_status_server()
+        
         # Avvia scheduler
         self.start_scheduler()
         
-        # Mantieni il processo attivo
+        # Mantieni il processo attivo fino a SIGTERM/SIGINT
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.stopping.set)
+        
         try:
-            while True:
-                await asyncio.sleep(60)
-        except KeyboardInterrupt:
+            await self.stopping.wait()
             logger.info("🛑 Shutdown richiesto")
-            self.scheduler.shutdown()
+            await self.drain()
+        except (KeyboardInterrupt, asyncio.CancelledError):
+            logger.info("🛑 Shutdown immediato")
+            if self.scheduler.running:
+                self.scheduler.shutdown(wait=False)
+        finally:
+            if self.ingest_runner:
+                await self.ingest_runner.cleanup()
+            if self.status_runner:
+                await self.status_runner.cleanup()
+            await self.publisher.close()
+            await self.outbox.close()
+            if self.leases:
+                await self.leases.close()
+            await self.close_http_session()
+            self.media_cache.close()
+            self.tracer.close()
 
 async def main():
     coordinator = DealCoordinator()
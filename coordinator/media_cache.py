@@ -0,0 +1,116 @@
+"""
+Media cache - Cache persistente ASIN -> file_id Telegram
+Dopo il primo upload riuscito la foto del prodotto viene ripubblicata
+tramite file_id, senza che Telegram debba scaricare di nuovo l'URL remoto.
+L'accesso a SQLite gira in un thread (asyncio.to_thread) come per l'outbox:
+i lookup non scrivono, l'ultimo utilizzo viene salvato in blocco alla
+scrittura successiva.
+"""
+
+import os
+import time
+import sqlite3
+import asyncio
+import logging
+import threading
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class MediaCache:
+    """Cache LRU su SQLite dei file_id delle foto già caricate su Telegram"""
+
+    def __init__(self, path: Optional[str] = None, max_entries: Optional[int] = None):
+        self.path = path or os.getenv('MEDIA_CACHE_PATH', '/tmp/coordinator_media.db')
+        self.max_entries = max_entries or int(os.getenv('MEDIA_CACHE_MAX_ENTRIES', 5000))
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # key → ultimo utilizzo, non ancora scritto su disco
+        self._touched: Dict[str, float] = {}
+
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS media ('
+            ' key TEXT PRIMARY KEY,'
+            ' file_id TEXT NOT NULL,'
+            ' created_at REAL NOT NULL,'
+            ' last_used REAL NOT NULL)'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS media_last_used ON media (last_used)')
+        self.conn.commit()
+
+        count = self.conn.execute('SELECT COUNT(*) FROM media').fetchone()[0]
+        logger.info(f"🖼️ Media cache: {count} file_id in {self.path}")
+
+    async def get(self, key: str) -> Optional[str]:
+        """Ritorna il file_id in cache o None; l'ultimo utilizzo resta in memoria"""
+        file_id = await asyncio.to_thread(self._select, key)
+        if file_id is None:
+            self.misses += 1
+            return None
+        self._touched[key] = time.time()
+        self.hits += 1
+        return file_id
+
+    async def put(self, key: str, file_id: str):
+        """Salva il file_id ed elimina le voci meno usate oltre il limite"""
+        touched, self._touched = self._touched, {}
+        await asyncio.to_thread(self._insert, key, file_id, touched)
+
+    async def invalidate(self, key: str):
+        """Rimuove un file_id rifiutato da Telegram"""
+        self._touched.pop(key, None)
+        await asyncio.to_thread(self._delete, key)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    # ------------------------------------------------------------------
+    # Accesso SQLite (thread separato)
+    # ------------------------------------------------------------------
+
+    def _select(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self.conn.execute('SELECT file_id FROM media WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def _write_touched(self, touched: Dict[str, float]):
+        self.conn.executemany(
+            'UPDATE media SET last_used = ? WHERE key = ?',
+            [(last_used, key) for key, last_used in touched.items()]
+        )
+
+    def _insert(self, key: str, file_id: str, touched: Dict[str, float]):
+        now = time.time()
+        with self._lock:
+            # Ultimi utilizzi dei lookup nella stessa transazione dell'inserimento
+            self._write_touched(touched)
+            self.conn.execute(
+                'INSERT OR REPLACE INTO media (key, file_id, created_at, last_used) VALUES (?, ?, ?, ?)',
+                (key, file_id, now, now)
+            )
+            self.conn.execute(
+                'DELETE FROM media WHERE key IN ('
+                ' SELECT key FROM media ORDER BY last_used DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            )
+            self.conn.commit()
+
+    def _delete(self, key: str):
+        with self._lock:
+            self.conn.execute('DELETE FROM media WHERE key = ?', (key,))
+            self.conn.commit()
+
+    def close(self):
+        with self._lock:
+            if self._touched:
+                self._write_touched(self._touched)
+                self.conn.commit()
+                self._touched = {}
+            self.conn.close()
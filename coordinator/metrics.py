@@ -0,0 +1,38 @@
+"""
+Metrics - Metriche Prometheus del coordinatore
+Esposte su GET /metrics dal server HTTP del coordinatore (porta 8000):
+latenza delle chiamate ai worker e di send_photo, durata dei cicli e
+contatori dei deals ricevuti, scartati, pubblicati e falliti.
+"""
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+# Round trip /scrape: dalla richiesta all'ultimo deal dello stream
+WORKER_REQUEST_SECONDS = Histogram(
+    'coordinator_worker_request_seconds',
+    'Durata delle chiamate /scrape ai worker',
+    ['country', 'outcome'],
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+)
+SEND_PHOTO_SECONDS = Histogram(
+    'coordinator_send_photo_seconds',
+    'Latenza di send_photo, retry e flood wait inclusi',
+    ['chat'],
+    buckets=(0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60, 120)
+)
+CYCLE_SECONDS = Histogram(
+    'coordinator_cycle_seconds',
+    'Durata dei cicli di processing (fetch, commit e pubblicazione)',
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600, 900, 1800)
+)
+
+DEALS_RECEIVED = Counter('coordinator_deals_received', 'Deals ricevuti dai worker', ['country'])
+DEALS_SKIPPED = Counter('coordinator_deals_skipped', 'Deals scartati perché già ricevuti', ['country'])
+DEALS_POSTED = Counter('coordinator_deals_posted', 'Deals pubblicati su Telegram', ['country'])
+DEALS_FAILED = Counter('coordinator_deals_failed', 'Tentativi di pubblicazione falliti', ['country'])
+FLOOD_WAITS = Counter('coordinator_flood_waits', 'Flood wait (RetryAfter) ricevuti da Telegram', ['chat'])
+
+
+def render():
+    """Corpo e content type della risposta /metrics"""
+    return generate_latest(), CONTENT_TYPE_LATEST
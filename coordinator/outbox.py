@@ -0,0 +1,262 @@
+"""
+Outbox - Coda di pubblicazione persistente su SQLite (WAL)
+I deals ricevuti dai worker vengono scritti su disco prima di essere
+pubblicati e cancellati solo dopo il post riuscito (at-least-once).
+Inserimenti e ack sono raggruppati in transazioni (group commit), così
+migliaia di deals costano poche fsync invece di una per deal.
+Con più repliche ogni outbox è un file nella cartella condivisa (OUTBOX_DIR,
+di default quella dei lease SQLite), così i deals di una replica morta
+possono passare a un'altra (adopt).
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import asyncio
+import logging
+import threading
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Callback invocata con i deals appena resi durevoli: [(deal, country), ...]
+CommitCallback = Callable[[List[Tuple[Dict, str]]], Awaitable[None]]
+
+
+FILE_PATTERN = re.compile(r'^coordinator_outbox_(.+)\.db$')
+
+
+def replica_name(replica: str) -> str:
+    """COORDINATOR_ID ridotto a caratteri validi in un nome di file"""
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', replica)
+
+
+def outbox_dir() -> str:
+    """Cartella delle outbox: OUTBOX_DIR, altrimenti quella del file dei lease
+    SQLite (volume condiviso tra le repliche), altrimenti /tmp"""
+    if os.getenv('OUTBOX_DIR'):
+        return os.getenv('OUTBOX_DIR')
+    scheme, sep, location = os.getenv('LEASE_BACKEND', '').partition('://')
+    lease_path = location if scheme == 'sqlite' else ('' if sep else scheme)
+    if lease_path:
+        return os.path.dirname(os.path.abspath(lease_path))
+    return '/tmp'
+
+
+def default_path(replica: Optional[str] = None) -> str:
+    """Outbox di una replica: con più repliche (COORDINATOR_ID) un file per ognuna"""
+    replica = replica_name(os.getenv('COORDINATOR_ID', '') if replica is None else replica)
+    name = f"coordinator_outbox_{replica}.db" if replica else 'coordinator_outbox.db'
+    return os.path.join(outbox_dir(), name)
+
+
+def replica_outboxes() -> Dict[str, str]:
+    """Outbox presenti nella cartella condivisa: nome della replica → percorso"""
+    directory = outbox_dir()
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return {}
+    return {
+        match.group(1): os.path.join(directory, name)
+        for name in names
+        for match in [FILE_PATTERN.match(name)] if match
+    }
+
+
+class Outbox:
+    """Outbox SQLite con scritture raggruppate e drenaggio at-least-once"""
+
+    def __init__(self, on_commit: CommitCallback, path: Optional[str] = None):
+        self.path = path or os.getenv('OUTBOX_PATH') or default_path()
+        self.batch_size = int(os.getenv('OUTBOX_BATCH_SIZE', 200))
+        self.flush_interval = float(os.getenv('OUTBOX_FLUSH_MS', 200)) / 1000
+        self.max_attempts = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 5))
+        self.on_commit = on_commit
+
+        # Scritture in attesa del prossimo group commit
+        self._inserts: List[Tuple[str, str, Dict, asyncio.Future]] = []
+        self._acks: List[str] = []
+        self._failures: List[str] = []
+        self._attempts: Dict[str, int] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self._db_lock = threading.Lock()
+
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        # In WAL, NORMAL sincronizza al checkpoint: durevole contro crash del processo
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS outbox ('
+            ' deal_id TEXT PRIMARY KEY,'
+            ' country TEXT NOT NULL,'
+            ' payload TEXT NOT NULL,'
+            " status TEXT NOT NULL DEFAULT 'pending',"
+            ' attempts INTEGER NOT NULL DEFAULT 0,'
+            ' created_at REAL NOT NULL)'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS outbox_status ON outbox (status, created_at)')
+
+    # ------------------------------------------------------------------
+    # API asincrona (event loop del coordinatore)
+    # ------------------------------------------------------------------
+
+    def add(self, deal_id: str, deal: Dict, country: str) -> asyncio.Future:
+        """Accoda un deal per il prossimo commit; il future si risolve a commit avvenuto"""
+        future = asyncio.get_running_loop().create_future()
+        self._inserts.append((deal_id, country, deal, future))
+        self._schedule_flush()
+        return future
+
+    def ack(self, deal_id: str):
+        """Segna un deal come pubblicato (cancellato al prossimo commit)"""
+        self._attempts.pop(deal_id, None)
+        self._acks.append(deal_id)
+        self._schedule_flush()
+
+    def fail(self, deal_id: str) -> bool:
+        """Segna un tentativo fallito; False se il deal ha esaurito OUTBOX_MAX_ATTEMPTS"""
+        attempts = self._attempts.get(deal_id, 0) + 1
+        self._failures.append(deal_id)
+        self._schedule_flush()
+        if attempts >= self.max_attempts:
+            self._attempts.pop(deal_id, None)
+            logger.error(f"❌ Deal {deal_id} scartato dopo {attempts} tentativi")
+            return False
+        self._attempts[deal_id] = attempts
+        return True
+
+    def _schedule_flush(self):
+        if len(self._inserts) + len(self._acks) + len(self._failures) >= self.batch_size:
+            asyncio.ensure_future(self.flush())
+        elif self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.ensure_future(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        await self.flush()
+
+    async def flush(self):
+        """Scrive in un'unica transazione tutti gli inserimenti e gli ack in attesa"""
+        async with self._flush_lock:
+            inserts, self._inserts = self._inserts, []
+            acks, self._acks = self._acks, []
+            failures, self._failures = self._failures, []
+            if not (inserts or acks or failures):
+                return
+
+            rows = [(deal_id, country, json.dumps(deal, ensure_ascii=False)) for deal_id, country, deal, _ in inserts]
+            try:
+                inserted = await asyncio.to_thread(self._commit, rows, acks, failures)
+            except Exception as e:
+                logger.error(f"❌ Errore commit outbox: {e}")
+                for *_, future in inserts:
+                    if not future.done():
+                        future.set_exception(e)
+                # Ack e tentativi falliti non vanno persi (un deal già pubblicato
+                # resterebbe 'pending' e ripartirebbe al riavvio): di nuovo in
+                # testa, col prossimo commit dopo OUTBOX_FLUSH_MS
+                self._acks[:0] = acks
+                self._failures[:0] = failures
+                if acks or failures:
+                    self._flush_task = asyncio.ensure_future(self._flush_later())
+                return
+
+            for *_, future in inserts:
+                if not future.done():
+                    future.set_result(True)
+
+            fresh = [(deal, country) for deal_id, country, deal, _ in inserts if deal_id in inserted]
+            if fresh:
+                await self.on_commit(fresh)
+
+    async def adopt(self, path: str) -> int:
+        """Sposta in questa outbox i deals in sospeso dell'outbox di un'altra replica.
+        Le righe escono dal file d'origine solo dopo il commit qui (at-least-once)"""
+        rows = await asyncio.to_thread(_read_pending, path)
+        if not rows:
+            return 0
+        futures = [self.add(deal_id, deal, country) for deal_id, deal, country in rows]
+        await self.flush()
+        await asyncio.gather(*futures)
+        await asyncio.to_thread(_delete_rows, path, [deal_id for deal_id, _, _ in rows])
+        logger.info(f"♻️ Outbox: {len(rows)} deals in sospeso presi da {path}")
+        return len(rows)
+
+    async def resume(self) -> int:
+        """Ripubblica i deals rimasti in outbox da un'esecuzione precedente"""
+        rows = await asyncio.to_thread(self._load_pending)
+        if rows:
+            logger.info(f"♻️ Outbox: {len(rows)} deals in sospeso ripresi da disco")
+            await self.on_commit(rows)
+        return len(rows)
+
+    # ------------------------------------------------------------------
+    # Accesso SQLite (thread separato)
+    # ------------------------------------------------------------------
+
+    def _commit(self, rows: List[Tuple[str, str, str]], acks: List[str], failures: List[str]) -> set:
+        inserted = set()
+        now = time.time()
+        with self._db_lock:
+            self.conn.execute('BEGIN')
+            try:
+                for deal_id, country, payload in rows:
+                    cursor = self.conn.execute(
+                        'INSERT OR IGNORE INTO outbox (deal_id, country, payload, created_at) VALUES (?, ?, ?, ?)',
+                        (deal_id, country, payload, now)
+                    )
+                    if cursor.rowcount:
+                        inserted.add(deal_id)
+                self.conn.executemany('DELETE FROM outbox WHERE deal_id = ?', [(deal_id,) for deal_id in acks])
+                self.conn.executemany(
+                    "UPDATE outbox SET attempts = attempts + 1, "
+                    "status = CASE WHEN attempts + 1 >= ? THEN 'dead' ELSE status END "
+                    "WHERE deal_id = ?",
+                    [(self.max_attempts, deal_id) for deal_id in failures]
+                )
+                self.conn.execute('COMMIT')
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+        return inserted
+
+    def _load_pending(self) -> List[Tuple[Dict, str]]:
+        with self._db_lock:
+            rows = self.conn.execute(
+                "SELECT payload, country FROM outbox WHERE status = 'pending' ORDER BY created_at"
+            ).fetchall()
+        return [(json.loads(payload), country) for payload, country in rows]
+
+    def pending_count(self) -> int:
+        with self._db_lock:
+            return self.conn.execute("SELECT COUNT(*) FROM outbox WHERE status = 'pending'").fetchone()[0]
+
+    async def close(self):
+        """Scrive le ultime operazioni in attesa e chiude il database"""
+        await self.flush()
+        with self._db_lock:
+            self.conn.close()
+
+
+def _read_pending(path: str) -> List[Tuple[str, Dict, str]]:
+    conn = sqlite3.connect(path, timeout=10)
+    try:
+        rows = conn.execute(
+            "SELECT deal_id, payload, country FROM outbox WHERE status = 'pending' ORDER BY created_at"
+        ).fetchall()
+    finally:
+        conn.close()
+    return [(deal_id, json.loads(payload), country) for deal_id, payload, country in rows]
+
+
+def _delete_rows(path: str, deal_ids: List[str]):
+    conn = sqlite3.connect(path, timeout=10)
+    try:
+        with conn:
+            conn.executemany('DELETE FROM outbox WHERE deal_id = ?', [(deal_id,) for deal_id in deal_ids])
+    finally:
+        conn.close()
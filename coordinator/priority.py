@@ -0,0 +1,141 @@
+"""
+Priority - Ordine di pubblicazione per valore del deal
+Il punteggio combina sconto percentuale, risparmio assoluto e freschezza;
+la coda di ogni chat pubblica per primi i deals con punteggio più alto,
+alternando i paesi che condividono la stessa chat.
+"""
+
+import os
+import re
+import math
+import time
+import heapq
+import asyncio
+import itertools
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+# "About £12.99 💥 45% Price drop", "-33%", "Sconto 20%"
+DISCOUNT_RE = re.compile(r'(?<!\d)(\d{1,2})\s?%')
+# £12.99, € 1.299,00, 19,99€
+PRICE_RE = re.compile(r'[£€]\s?(\d{1,3}(?:[.,]\d{3})*(?:[.,]\d{1,2})?)|(\d{1,3}(?:[.,]\d{3})*(?:[.,]\d{1,2})?)\s?[£€]')
+
+
+def parse_amount(value: str) -> Optional[float]:
+    """Importo da formato UK (1,299.00) o IT (1.299,00)"""
+    value = value.replace(' ', '')
+    if ',' in value and '.' in value:
+        thousands, decimal = (',', '.') if value.rfind('.') > value.rfind(',') else ('.', ',')
+        value = value.replace(thousands, '').replace(decimal, '.')
+    elif ',' in value:
+        integer, _, fraction = value.rpartition(',')
+        value = f"{integer.replace(',', '')}.{fraction}" if len(fraction) <= 2 else value.replace(',', '')
+    elif value.count('.') == 1 and len(value.rpartition('.')[2]) == 3:
+        value = value.replace('.', '')
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def deal_value(text: str) -> Tuple[Optional[int], Optional[float]]:
+    """(sconto %, risparmio) ricavati dal testo del messaggio, None se assenti"""
+    match = DISCOUNT_RE.search(text)
+    discount = int(match.group(1)) if match and 0 < int(match.group(1)) < 100 else None
+
+    prices: List[float] = []
+    for match in PRICE_RE.finditer(text):
+        amount = parse_amount(match.group(1) or match.group(2))
+        if amount:
+            prices.append(amount)
+
+    saving = None
+    if len(prices) >= 2:
+        # Prezzo attuale e prezzo precedente
+        saving = max(prices) - min(prices)
+    elif prices and discount:
+        # Solo il prezzo attuale: il precedente si ricava dallo sconto
+        saving = prices[0] * discount / (100 - discount)
+    return discount, saving
+
+
+class DealScorer:
+    """Valore = peso sconto × % + peso risparmio × risparmio, dimezzato ogni
+    PRIORITY_HALF_LIFE_SECONDS di età del deal"""
+
+    def __init__(self):
+        self.discount_weight = float(os.getenv('PRIORITY_DISCOUNT_WEIGHT', 1.0))
+        self.saving_weight = float(os.getenv('PRIORITY_SAVING_WEIGHT', 0.5))
+        self.saving_cap = float(os.getenv('PRIORITY_SAVING_CAP', 100))
+        self.half_life = float(os.getenv('PRIORITY_HALF_LIFE_SECONDS', 1800))
+
+    def score(self, deal: Dict) -> float:
+        """Punteggio in scala log2: log2(valore) - età / half-life, a meno di un termine
+        comune a tutti i deals. Non dipende dall'istante del calcolo, quindi
+        l'ordine della coda resta valido mentre i deals invecchiano."""
+        discount, saving = deal_value(deal.get('message_text') or '')
+        # Base 1: i deals senza prezzo né sconto restano ordinati per freschezza
+        value = 1.0 + self.discount_weight * (discount or 0) + self.saving_weight * min(saving or 0, self.saving_cap)
+
+        scraped_at = time.time()
+        if deal.get('scraped_at'):
+            try:
+                scraped_at = datetime.fromisoformat(deal['scraped_at']).timestamp()
+            except ValueError:
+                pass
+        return math.log2(value) + scraped_at / self.half_life
+
+
+class DealPriorityQueue(asyncio.Queue):
+    """Coda asincrona (deal, worker_config) ordinata per punteggio, con equità tra paesi:
+    il valore del migliore deal di un paese è diviso per quanto quel paese ha
+    pubblicato di recente, così un paese non monopolizza una chat condivisa."""
+
+    def __init__(self, scorer: DealScorer):
+        self.scorer = scorer
+        self.fairness_decay = float(os.getenv('PRIORITY_FAIRNESS_DECAY', 0.5))
+        super().__init__()
+
+    def _init(self, maxsize):
+        self._queue: Dict[str, List] = {}
+        self._served: Dict[str, float] = {}
+        self._size = 0
+        self._counter = itertools.count()
+
+    def qsize(self) -> int:
+        return self._size
+
+    def empty(self) -> bool:
+        return self._size == 0
+
+    def _put(self, item):
+        deal, _ = item
+        country = deal.get('country') or ''
+        # Parità di punteggio: prima il deal arrivato prima
+        heapq.heappush(self._queue.setdefault(country, []), (-self.scorer.score(deal), next(self._counter), item))
+        self._size += 1
+
+    def _best_country(self) -> str:
+        return max(
+            (country for country, heap in self._queue.items() if heap),
+            key=lambda country: -self._queue[country][0][0] - math.log2(1 + self._served.get(country, 0.0))
+        )
+
+    def _get(self):
+        _, _, item = heapq.heappop(self._queue[self._best_country()])
+        self._size -= 1
+        return item
+
+    def exchange(self, item):
+        """Scelta finale dopo l'attesa del rate limiter: se nel frattempo è arrivato
+        un deal migliore lo restituisce e rimette in coda `item` (conteggi invariati).
+        Il paese del deal scelto conta come servito per l'equità."""
+        if self._size:
+            self._put(item)
+            item = self._get()
+        deal, _ = item
+        for country in self._served:
+            self._served[country] *= self.fairness_decay
+        country = deal.get('country') or ''
+        self._served[country] = self._served.get(country, 0.0) + 1
+        return item
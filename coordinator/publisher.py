@@ -0,0 +1,220 @@
+"""
+Publisher - Code di pubblicazione per canale Telegram
+Una coda asincrona per ogni chat di destinazione, ognuna con il proprio
+token bucket, più un bucket globale condiviso per il limite del bot.
+Il ritmo di ogni chat si adatta ai flood wait ricevuti da Telegram.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+from priority import DealPriorityQueue, DealScorer
+
+logger = logging.getLogger(__name__)
+
+# Limiti Bot API Telegram (https://core.telegram.org/bots/faq#broadcasting-to-users)
+TELEGRAM_GLOBAL_RATE = 30.0       # messaggi/secondo per bot
+TELEGRAM_CHAT_RATE = 1.0          # messaggi/secondo per singola chat
+TELEGRAM_CHAT_PER_MINUTE = 20     # messaggi/minuto per gruppo o canale
+
+SendFunc = Callable[[Dict, Dict], Awaitable[bool]]
+
+
+class TokenBucket:
+    """Token bucket asincrono: `rate` token al secondo, al massimo `capacity` accumulati"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        """Attende finché un token è disponibile e lo consuma"""
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class AdaptiveRate:
+    """Controllo AIMD del ritmo di una chat: dimezza ai flood, risale piano dopo i successi"""
+
+    def __init__(self, buckets: list, chat_id=None):
+        self.chat_id = chat_id
+        self.buckets = buckets
+        self.base_rates = [bucket.rate for bucket in buckets]
+        self.factor = 1.0
+        self.min_factor = float(os.getenv('PUBLISH_RATE_MIN_FACTOR', 0.05))
+        self.max_factor = float(os.getenv('PUBLISH_RATE_MAX_FACTOR', 1.5))
+        self.increase_step = float(os.getenv('PUBLISH_RATE_STEP', 0.05))
+        self.increase_every = int(os.getenv('PUBLISH_RATE_INCREASE_EVERY', 10))
+        self.successes = 0
+        self.floods = 0
+
+    def _apply(self):
+        for bucket, base_rate in zip(self.buckets, self.base_rates):
+            bucket.rate = base_rate * self.factor
+
+    def rebase(self, base_rates: List[float]):
+        """Nuovi ritmi di base, mantenendo il fattore adattivo corrente"""
+        self.base_rates = list(base_rates)
+        self._apply()
+
+    def on_success(self):
+        self.successes += 1
+        if self.successes >= self.increase_every and self.factor < self.max_factor:
+            self.successes = 0
+            self.factor = min(self.max_factor, self.factor + self.increase_step)
+            self._apply()
+
+    def on_flood(self, retry_after: float):
+        self.floods += 1
+        self.successes = 0
+        self.factor = max(self.min_factor, self.factor / 2)
+        self._apply()
+        # I token accumulati non valgono più: la chat riparte dopo la penalità
+        for bucket in self.buckets:
+            bucket.tokens = 0
+        logger.warning(
+            f"🐢 Flood su {self.chat_id}: attesa {retry_after:.0f}s, ritmo ridotto a x{self.factor:.2f}"
+        )
+
+
+class ChannelQueue:
+    """Coda di pubblicazione di una singola chat, drenata da un task dedicato"""
+
+    def __init__(
+        self,
+        chat_id: Union[int, str],
+        send: SendFunc,
+        chat_buckets: List[TokenBucket],
+        global_bucket: TokenBucket,
+        scorer: Optional[DealScorer] = None
+    ):
+        self.chat_id = chat_id
+        self.send = send
+        self.limiters = chat_buckets + [global_bucket]
+        self.rate = AdaptiveRate(chat_buckets, chat_id)
+        # Con lo scorer la coda pubblica prima i deals di maggior valore
+        self.queue: asyncio.Queue = DealPriorityQueue(scorer) if scorer else asyncio.Queue()
+        self.posted = 0
+        self.failed = 0
+        self.task = asyncio.create_task(self._drain())
+
+    async def _drain(self):
+        while True:
+            deal, worker_config = await self.queue.get()
+            try:
+                # Prima i limiti della chat, poi quello globale: non si spreca
+                # un token globale mentre si aspetta la propria chat
+                for limiter in self.limiters:
+                    await limiter.acquire()
+                # Il token va al deal migliore arrivato durante l'attesa
+                if isinstance(self.queue, DealPriorityQueue):
+                    deal, worker_config = self.queue.exchange((deal, worker_config))
+                if await self.send(deal, worker_config):
+                    self.posted += 1
+                else:
+                    self.failed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Errore pubblicazione deal {deal.get('asin', 'unknown')} su {self.chat_id}: {e}")
+            finally:
+                self.queue.task_done()
+
+
+class Publisher:
+    """Smista i deals nelle code per chat e le drena in parallelo"""
+
+    def __init__(self, send: SendFunc):
+        self.send = send
+        self.chat_rate = float(os.getenv('PUBLISH_CHAT_RATE', TELEGRAM_CHAT_RATE))
+        self.chat_per_minute = float(os.getenv('PUBLISH_CHAT_PER_MINUTE', TELEGRAM_CHAT_PER_MINUTE))
+        self.global_rate = float(os.getenv('PUBLISH_GLOBAL_RATE', TELEGRAM_GLOBAL_RATE))
+        self.global_bucket = TokenBucket(self.global_rate, self.global_rate)
+        # Ordine di pubblicazione per valore (PUBLISH_PRIORITY=0: ordine di arrivo)
+        self.scorer = DealScorer() if os.getenv('PUBLISH_PRIORITY', '1') == '1' else None
+        self.channels: Dict[Union[int, str], ChannelQueue] = {}
+        # Limiti propri di alcune chat: (messaggi/secondo, messaggi/minuto)
+        self.chat_limits: Dict[Union[int, str], Tuple[float, float]] = {}
+
+    def _limits(self, chat_id: Union[int, str]) -> Tuple[float, float]:
+        return self.chat_limits.get(chat_id, (self.chat_rate, self.chat_per_minute))
+
+    def _channel(self, chat_id: Union[int, str]) -> ChannelQueue:
+        channel = self.channels.get(chat_id)
+        if channel is None:
+            chat_rate, chat_per_minute = self._limits(chat_id)
+            chat_buckets = [
+                TokenBucket(chat_rate, 1),
+                TokenBucket(chat_per_minute / 60, chat_per_minute),
+            ]
+            channel = ChannelQueue(chat_id, self.send, chat_buckets, self.global_bucket, self.scorer)
+            self.channels[chat_id] = channel
+            logger.info(f"📬 Coda di pubblicazione creata per {chat_id}")
+        return channel
+
+    def submit(self, deal: Dict, worker_config: Dict):
+        """Accoda un deal sulla coda della chat di destinazione"""
+        chat_id = worker_config.get('channel_id') or worker_config['channel']
+        self._channel(chat_id).queue.put_nowait((deal, worker_config))
+
+    def configure(self, chat_id: Union[int, str], rate: Optional[float] = None, per_minute: Optional[float] = None):
+        """Ritmo di pubblicazione di una chat; None torna ai limiti globali"""
+        limits = (rate or self.chat_rate, per_minute or self.chat_per_minute)
+        if limits == self._limits(chat_id):
+            return
+        self.chat_limits[chat_id] = limits
+        channel = self.channels.get(chat_id)
+        if channel:
+            # La coda esistente mantiene il fattore adattivo, cambiano le basi
+            chat_rate, chat_per_minute = limits
+            channel.rate.rebase([chat_rate, chat_per_minute / 60])
+            channel.rate.buckets[1].capacity = chat_per_minute
+        logger.info(f"📬 Ritmo di {chat_id}: {limits[0]:g}/s, {limits[1]:g}/min")
+
+    def set_global_share(self, replicas: int):
+        """Più repliche sullo stesso bot: ognuna usa la sua quota del limite globale"""
+        rate = self.global_rate / max(1, replicas)
+        if rate != self.global_bucket.rate:
+            self.global_bucket.rate = rate
+            self.global_bucket.capacity = max(1.0, rate)
+            logger.info(f"📬 Limite globale per replica: {rate:g} messaggi/s ({replicas} repliche)")
+
+    def rate_control(self, chat_id: Union[int, str]) -> AdaptiveRate:
+        """Controllo adattivo del ritmo di una chat"""
+        return self._channel(chat_id).rate
+
+    @property
+    def posted(self) -> int:
+        return sum(channel.posted for channel in self.channels.values())
+
+    @property
+    def pending(self) -> int:
+        return sum(channel.queue.qsize() for channel in self.channels.values())
+
+    async def join(self):
+        """Attende che tutte le code siano state drenate"""
+        await asyncio.gather(*(channel.queue.join() for channel in list(self.channels.values())))
+
+    async def close(self):
+        """Ferma i task di pubblicazione"""
+        for channel in self.channels.values():
+            channel.task.cancel()
+        await asyncio.gather(*(channel.task for channel in self.channels.values()), return_exceptions=True)
+        self.channels.clear()
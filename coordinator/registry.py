@@ -0,0 +1,153 @@
+"""
+Registry - Worker configurati da manifest, ricaricato a caldo
+Il manifest JSON (WORKERS_MANIFEST) elenca i marketplace con URL del
+worker, canale di pubblicazione, tag affiliato e limiti propri: timeout,
+richieste concorrenti, intervallo di polling e ritmo di pubblicazione.
+Il coordinatore lo rilegge periodicamente: worker aggiunti, rimossi o
+modificati entrano in servizio senza riavvio.
+Senza manifest restano i worker UK e IT configurati da variabili d'ambiente.
+"""
+
+import os
+import json
+import logging
+from typing import Dict, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Chiavi opzionali di una voce del manifest e loro tipo
+OPTIONAL_FIELDS = {
+    'channel': str,
+    'channel_id': int,
+    'affiliate_tag': str,
+    'domain': str,
+    'timeout': float,
+    'concurrency': int,
+    'poll_min_seconds': float,
+    'poll_max_seconds': float,
+    'publish_rate': float,
+    'publish_per_minute': float,
+}
+
+
+def env_workers() -> Dict[str, Dict]:
+    """Worker UK e IT configurati da variabili d'ambiente (senza manifest)"""
+    workers = {}
+    
+    # Worker UK
+    worker_uk_url = os.getenv('WORKER_UK_URL', 'http://127.0.0.1:8001/uk')
+    if worker_uk_url:
+        workers['UK'] = {
+            'url': worker_uk_url,
+            'channel': os.getenv('UK_CHANNEL', '@DealScoutUKBot'),
+            'channel_id': int(os.getenv('UK_CHANNEL_ID', -1001232723285)),
+            'affiliate_tag': 'ukbestdeal02-21',
+            'domain': 'amazon.co.uk'
+        }
+    
+    # Worker IT (opzionale)
+    worker_it_url = os.getenv('WORKER_IT_URL', 'http://127.0.0.1:8001/it')
+    if worker_it_url:
+        workers['IT'] = {
+            'url': worker_it_url,
+            'channel': os.getenv('IT_CHANNEL', '@AmazonITDealScout'),
+            'channel_id': int(os.getenv('IT_CHANNEL_ID', -1001080585126)),
+            'affiliate_tag': 'srzone00-21',
+            'domain': 'amazon.it'
+        }
+    
+    return workers
+
+
+def parse_manifest(data: Dict) -> Dict[str, Dict]:
+    """Valida il manifest e restituisce i worker abilitati per paese"""
+    entries = data.get('workers')
+    if not isinstance(entries, list):
+        raise ValueError("il manifest deve contenere una lista 'workers'")
+    
+    workers = {}
+    for index, entry in enumerate(entries):
+        country = str(entry.get('country', '')).upper()
+        if not country or not entry.get('url'):
+            raise ValueError(f"voce {index}: 'country' e 'url' sono obbligatori")
+        if country in workers:
+            raise ValueError(f"voce {index}: worker {country} duplicato")
+        if not entry.get('channel') and not entry.get('channel_id'):
+            raise ValueError(f"voce {index}: serve 'channel' o 'channel_id'")
+        if not entry.get('enabled', True):
+            continue
+        
+        worker_config = {'url': str(entry['url']).rstrip('/')}
+        for field, cast in OPTIONAL_FIELDS.items():
+            if entry.get(field) is not None:
+                try:
+                    worker_config[field] = cast(entry[field])
+                except (TypeError, ValueError):
+                    raise ValueError(f"voce {index}: valore non valido per '{field}'")
+        worker_config.setdefault('channel', str(worker_config.get('channel_id')))
+        workers[country] = worker_config
+    return workers
+
+
+class WorkerRegistry:
+    """Worker attivi, dal manifest JSON o dalle variabili d'ambiente"""
+
+    def __init__(self, defaults: Dict, path: Optional[str] = None):
+        self.path = path if path is not None else os.getenv('WORKERS_MANIFEST', '')
+        self.defaults = defaults
+        self.mtime: Optional[float] = None
+        self.workers: Dict[str, Dict] = {}
+
+    def _with_defaults(self, workers: Dict[str, Dict]) -> Dict[str, Dict]:
+        for country, worker_config in workers.items():
+            for field, value in self.defaults.items():
+                worker_config.setdefault(field, value)
+            # WORKER_<PAESE>_TIMEOUT resta valido anche con il manifest
+            if os.getenv(f'WORKER_{country}_TIMEOUT'):
+                worker_config['timeout'] = float(os.getenv(f'WORKER_{country}_TIMEOUT'))
+        return workers
+
+    def _read(self) -> Dict[str, Dict]:
+        with open(self.path, 'r') as f:
+            return parse_manifest(json.load(f))
+
+    def load(self) -> Dict[str, Dict]:
+        """Primo caricamento: un manifest non valido blocca l'avvio"""
+        if self.path:
+            self.mtime = os.path.getmtime(self.path)
+            self.workers = self._with_defaults(self._read())
+            logger.info(f"📒 Manifest {self.path}: {len(self.workers)} worker")
+        else:
+            self.workers = self._with_defaults(env_workers())
+        
+        for country, worker_config in self.workers.items():
+            logger.info(f"Worker {country} configurato: {worker_config['url']}")
+        return self.workers
+
+    def reload(self) -> Optional[Tuple[Set[str], Set[str], Set[str]]]:
+        """Rilegge il manifest se è cambiato: (aggiunti, rimossi, modificati), None se invariato.
+        Un manifest non valido viene ignorato e restano i worker attuali."""
+        if not self.path:
+            return None
+        try:
+            mtime = os.path.getmtime(self.path)
+            if mtime == self.mtime:
+                return None
+            workers = self._with_defaults(self._read())
+        except (OSError, ValueError) as e:
+            logger.error(f"❌ Manifest {self.path} non ricaricato: {e}")
+            return None
+        
+        self.mtime = mtime
+        added = workers.keys() - self.workers.keys()
+        removed = self.workers.keys() - workers.keys()
+        changed = {
+            country for country in workers.keys() & self.workers.keys()
+            if workers[country] != self.workers[country]
+        }
+        self.workers = workers
+        if added or removed or changed:
+            logger.info(
+                f"📒 Manifest ricaricato: +{sorted(added)} -{sorted(removed)} ~{sorted(changed)}"
+            )
+        return set(added), set(removed), changed
@@ -0,0 +1,76 @@
+"""
+Retry - Esecuzione delle chiamate Bot API con retry e controllo flood
+- RetryAfter (flood wait): attende esattamente retry_after e rallenta la chat
+- Errori di rete transitori: backoff esponenziale con jitter
+- BadRequest e altri errori definitivi: nessun retry
+"""
+
+import os
+import random
+import asyncio
+import logging
+from datetime import timedelta
+from typing import Awaitable, Callable, Optional, TypeVar, Union
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TimedOut
+
+from metrics import FLOOD_WAITS
+from publisher import AdaptiveRate
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+def _seconds(value: Union[int, float, timedelta]) -> float:
+    """retry_after è un int in PTB 20, un timedelta nelle versioni successive"""
+    return value.total_seconds() if isinstance(value, timedelta) else float(value)
+
+
+class TelegramRetry:
+    """Wrapper di retry per le chiamate Bot API"""
+
+    def __init__(self):
+        self.max_attempts = int(os.getenv('TELEGRAM_MAX_ATTEMPTS', 5))
+        self.base_delay = float(os.getenv('TELEGRAM_RETRY_BASE_DELAY', 1))
+        self.max_delay = float(os.getenv('TELEGRAM_RETRY_MAX_DELAY', 60))
+        self.flood_waits = 0
+
+    async def call(
+        self,
+        func: Callable[[], Awaitable[T]],
+        rate: Optional[AdaptiveRate] = None,
+        description: str = 'chiamata Bot API'
+    ) -> T:
+        """Esegue func() finché riesce, rispettando flood wait e backoff"""
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                result = await func()
+                if rate:
+                    rate.on_success()
+                return result
+
+            except RetryAfter as e:
+                wait = _seconds(e.retry_after)
+                self.flood_waits += 1
+                FLOOD_WAITS.labels(str(rate.chat_id) if rate else 'global').inc()
+                if rate:
+                    rate.on_flood(wait)
+                if attempt == self.max_attempts:
+                    raise
+                logger.warning(f"⏳ Flood wait {wait:.0f}s per {description} (tentativo {attempt}/{self.max_attempts})")
+                await asyncio.sleep(wait + random.uniform(0, 1))
+
+            except (BadRequest, Forbidden):
+                # Errori definitivi: ritentare non cambia l'esito
+                raise
+
+            except (TimedOut, NetworkError) as e:
+                if attempt == self.max_attempts:
+                    raise
+                delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+                delay = random.uniform(delay / 2, delay)
+                logger.warning(f"⚠️ Errore di rete su {description}: {e} - nuovo tentativo tra {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+        raise RuntimeError(f"{description}: tentativi esauriti")
@@ -0,0 +1,139 @@
+"""
+Scheduling - Protezione dai cicli sovrapposti, backpressure e polling adattivo
+Un solo ciclo di processing alla volta: le esecuzioni che arrivano mentre
+un ciclo è ancora in corso vengono accorpate (saltate e contate), e la
+finestra di fetch del ciclo successivo si riduce finché i cicli non
+tornano a stare nel loro intervallo. Ogni worker ha poi il proprio
+intervallo di polling, ricalcolato dal ritmo dei deals che restituisce.
+"""
+
+import os
+import time
+import logging
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CycleGuard:
+    """Serializza i cicli e adatta la finestra di fetch alla durata osservata"""
+
+    def __init__(self, interval_seconds: float):
+        self.interval = interval_seconds
+        self.max_window = int(os.getenv('FETCH_WINDOW_MAX', 50))
+        self.min_window = int(os.getenv('FETCH_WINDOW_MIN', 5))
+        self.overrun_ratio = float(os.getenv('CYCLE_OVERRUN_RATIO', 0.8))
+
+        self.fetch_window = self.max_window
+        self.running = False
+        self.started_at: Optional[float] = None
+        self.last_duration: Optional[float] = None
+        self.coalesced = 0  # Esecuzioni accorpate durante il ciclo corrente
+
+    def try_start(self) -> bool:
+        """Segna l'inizio di un ciclo; False se ce n'è già uno in corso"""
+        if self.running:
+            self.coalesced += 1
+            elapsed = time.monotonic() - self.started_at
+            logger.warning(
+                f"⏳ Ciclo precedente ancora in corso da {elapsed:.0f}s: "
+                f"esecuzione accorpata ({self.coalesced} in attesa)"
+            )
+            return False
+        self.running = True
+        self.started_at = time.monotonic()
+        return True
+
+    def finish(self) -> float:
+        """Chiude il ciclo e ricalcola la finestra di fetch del prossimo"""
+        duration = time.monotonic() - self.started_at
+        overrun = self.coalesced > 0 or duration > self.interval * self.overrun_ratio
+
+        previous = self.fetch_window
+        if overrun:
+            self.fetch_window = max(self.min_window, self.fetch_window // 2)
+        elif duration < self.interval / 2:
+            self.fetch_window = min(self.max_window, self.fetch_window * 2)
+
+        if self.fetch_window != previous:
+            logger.info(f"🎚️ Finestra di fetch: {previous} → {self.fetch_window} (ciclo durato {duration:.0f}s)")
+        if overrun:
+            logger.warning(
+                f"⚠️ Ciclo in overrun ({duration:.0f}s su intervallo {self.interval:.0f}s, "
+                f"{self.coalesced} esecuzioni accorpate)"
+            )
+
+        self.running = False
+        self.last_duration = duration
+        self.coalesced = 0
+        return duration
+
+
+class AdaptivePoller:
+    """Intervallo di polling per worker, calcolato dal ritmo dei nuovi deals.
+    Nei periodi intensi l'intervallo scende verso POLL_MIN_SECONDS, quando il
+    canale è fermo risale fino a POLL_MAX_SECONDS."""
+
+    def __init__(self, max_interval: float):
+        self.min_interval = float(os.getenv('POLL_MIN_SECONDS', 60))
+        self.max_interval = float(os.getenv('POLL_MAX_SECONDS', max_interval))
+        self.target_deals = float(os.getenv('POLL_TARGET_DEALS', 3))
+        self.smoothing = float(os.getenv('POLL_RATE_SMOOTHING', 0.5))
+        self.idle_backoff = float(os.getenv('POLL_IDLE_BACKOFF', 1.5))
+        self.workers: Dict[str, Dict] = {}
+
+    def _state(self, country: str) -> Dict:
+        state = self.workers.get(country)
+        if state is None:
+            state = self.workers[country] = {
+                'min': self.min_interval,
+                'max': self.max_interval,
+                'interval': self.min_interval,
+                'rate': None,        # deals/secondo (media esponenziale)
+                'last_poll': None,
+                'next_poll': 0.0,    # nuovo worker: subito
+            }
+        return state
+
+    def configure(self, country: str, min_interval: Optional[float] = None, max_interval: Optional[float] = None):
+        """Limiti di polling propri di un worker (default POLL_MIN/MAX_SECONDS)"""
+        state = self._state(country)
+        state['min'] = min_interval if min_interval is not None else self.min_interval
+        state['max'] = max(state['min'], max_interval if max_interval is not None else self.max_interval)
+        state['interval'] = min(state['max'], max(state['min'], state['interval']))
+
+    def forget(self, country: str):
+        """Rimuove lo stato di un worker non più configurato"""
+        self.workers.pop(country, None)
+
+    def due(self, countries: Iterable[str]) -> List[str]:
+        """Worker il cui prossimo polling è scaduto"""
+        now = time.monotonic()
+        return [country for country in countries if self._state(country)['next_poll'] <= now]
+
+    def record(self, country: str, deals: int) -> float:
+        """Aggiorna il ritmo osservato e pianifica il prossimo polling del worker"""
+        now = time.monotonic()
+        state = self._state(country)
+
+        if state['last_poll'] is not None:
+            observed = deals / max(now - state['last_poll'], 1.0)
+            if state['rate'] is None:
+                state['rate'] = observed
+            else:
+                state['rate'] = self.smoothing * observed + (1 - self.smoothing) * state['rate']
+
+        if deals == 0 or not state['rate']:
+            # Canale fermo: allunga l'intervallo
+            interval = state['interval'] * self.idle_backoff
+        else:
+            # Abbastanza tempo per trovare circa POLL_TARGET_DEALS nuovi deals
+            interval = self.target_deals / state['rate']
+        interval = min(state['max'], max(state['min'], interval))
+
+        if abs(interval - state['interval']) >= 1:
+            logger.info(f"⏱️ Worker {country}: polling ogni {interval:.0f}s ({deals} deals nell'ultimo ciclo)")
+        state['interval'] = interval
+        state['last_poll'] = now
+        state['next_poll'] = now + interval
+        return interval
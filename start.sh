@@ -1,38 +1,37 @@
 #!/bin/bash
 
-# Avvia worker UK in background
-echo "🇬🇧 Avvio Worker UK..."
-python -u workers/uk/worker_uk_v2.py &
-WORKER_UK_PID=$!
+# Avvia il worker in background: un solo processo per tutte le sorgenti
+# (WORKER_COUNTRIES o WORKER_SOURCES), endpoint /uk/scrape, /it/scrape, ...
+echo "🌍 Avvio Worker (${WORKER_COUNTRIES:-UK,IT})..."
+python -u workers/main.py &
+WORKER_PID=$!
 
-# Avvia worker IT in background
-echo "🇮🇹 Avvio Worker IT..."
-python -u workers/it/worker_it.py &
-WORKER_IT_PID=$!
-
-# Aspetta che entrambi i worker siano pronti
-echo "Aspettando che i worker siano pronti..."
-
-# Aspetta Worker UK
+# Aspetta che il worker sia pronto
+echo "Aspettando che il worker sia pronto..."
 for i in {1..30}; do
     if curl -s http://127.0.0.1:8001/health > /dev/null 2>&1; then
-        echo "✅ Worker UK pronto!"
+        echo "✅ Worker pronto!"
         break
     fi
-    echo "Worker UK - Tentativo $i/30..."
+    echo "Worker - Tentativo $i/30..."
     sleep 1
 done
 
-# Aspetta Worker IT
-for i in {1..30}; do
-    if curl -s http://127.0.0.1:8002/health > /dev/null 2>&1; then
-        echo "✅ Worker IT pronto!"
-        break
-    fi
-    echo "Worker IT - Tentativo $i/30..."
-    sleep 1
-done
+# Shutdown graduale (docker stop / redeploy): prima il coordinatore, che
+# finisce il ciclo in corso e svuota le code, poi i worker
+shutdown() {
+    echo "🛑 Shutdown: drain del coordinatore..."
+    kill -TERM "$COORDINATOR_PID" 2>/dev/null
+    wait "$COORDINATOR_PID"
+    echo "🛑 Shutdown: drain del worker..."
+    kill -TERM "$WORKER_PID" 2>/dev/null
+    wait "$WORKER_PID"
+    exit 0
+}
+trap shutdown TERM INT
 
-# Avvia coordinator in foreground
+# Avvia coordinator (in background per poter inoltrare i segnali)
 echo "🚀 Avvio Coordinator..."
-python -u coordinator/main.py
+python -u coordinator/main.py &
+COORDINATOR_PID=$!
+wait "$COORDINATOR_PID"
@@ -0,0 +1,3 @@
+"""
+Componenti condivisi tra i worker (UK, IT, ...)
+"""
@@ -0,0 +1,188 @@
+"""
+Dedup - ASIN già pubblicati per paese, con scadenza e tetto di memoria
+Sostituisce i set processed_asins in memoria: una voce per (paese, ASIN)
+scade dopo DEDUP_TTL_SECONDS, così un nuovo ribasso su un ASIN vecchio
+torna a passare. Paese e ASIN sono impacchettati in un intero a 62 bit e
+le voci vivono in due array paralleli ordinati per chiave (chiave 8 byte,
+scadenza 4 byte): 12 byte per voce contro il centinaio di un set di
+stringhe. Lookup con bisect; le voci scadute escono a ogni pulizia
+periodica e oltre DEDUP_MAX_ENTRIES si perdono le più vecchie.
+Snapshot binari su DEDUP_FILE periodicamente (in un thread) e allo
+shutdown; all'avvio si ricaricano con due frombytes, senza ripubblicare.
+"""
+
+import os
+import sys
+import time
+import zlib
+import heapq
+import struct
+import asyncio
+import logging
+from array import array
+from bisect import bisect_left
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'DDP2'
+HEADER = struct.Struct('<4sI')  # magic, numero di voci
+
+# Pulizia delle voci scadute al massimo ogni SWEEP_SECONDS; oltre il tetto si
+# scende a EVICT_TARGET del massimo, così la pulizia non scatta a ogni add
+SWEEP_SECONDS = 300
+EVICT_TARGET = 0.9
+
+
+def pack_key(country: str, asin: str) -> int:
+    """(paese, ASIN) in un intero: 10 bit per il paese, 52 bit per l'ASIN in base 36"""
+    country = country.upper()
+    if len(country) == 2 and country.isalpha():
+        code = (ord(country[0]) - 64) * 27 + (ord(country[1]) - 64)
+    else:
+        code = zlib.crc32(country.encode()) % 729
+    return (code << 52) | int(asin, 36)
+
+
+class DedupStore:
+    """Insieme con TTL di (paese, ASIN) già visti"""
+
+    def __init__(self, path: str = '', ttl: float = 86400, max_entries: int = 200000, save_interval: float = 300):
+        self.path = path
+        self.ttl = int(ttl)
+        self.max_entries = max_entries
+        self.save_interval = save_interval
+
+        # Chiavi ordinate e scadenze (epoch in secondi) alla stessa posizione
+        self._keys = array('Q')
+        self._expiry = array('I')
+        self.evicted = 0
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        self._swept_at = time.monotonic()
+        self._save_task: Optional[asyncio.Future] = None
+        self._load()
+
+    @classmethod
+    def from_env(cls) -> 'DedupStore':
+        return cls(
+            path=os.getenv('DEDUP_FILE', '/tmp/worker_dedup.bin'),
+            ttl=float(os.getenv('DEDUP_TTL_SECONDS', 86400)),
+            max_entries=int(os.getenv('DEDUP_MAX_ENTRIES', 200000)),
+            save_interval=float(os.getenv('DEDUP_SAVE_SECONDS', 300))
+        )
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _find(self, key: int) -> int:
+        """Posizione della chiave; -1 se assente"""
+        index = bisect_left(self._keys, key)
+        if index < len(self._keys) and self._keys[index] == key:
+            return index
+        return -1
+
+    def _retain(self, cutoff: int):
+        """Tiene solo le voci che scadono dopo cutoff (l'ordine per chiave resta)"""
+        if not self._expiry or min(self._expiry) > cutoff:
+            return
+        keep = [(key, expires_at) for key, expires_at in zip(self._keys, self._expiry) if expires_at > cutoff]
+        self._keys = array('Q', [key for key, _ in keep])
+        self._expiry = array('I', [expires_at for _, expires_at in keep])
+
+    def _expire(self, now: int, protect: Optional[int] = None):
+        self._retain(now)
+        self._swept_at = time.monotonic()
+
+        excess = len(self._keys) - self.max_entries
+        if excess > 0:
+            # Oltre il tetto: fuori esattamente le `drop` voci più vecchie, fino a
+            # EVICT_TARGET del massimo. Per indice e non per soglia di scadenza:
+            # con scadenze a pari merito una soglia toglierebbe troppo. La chiave
+            # appena aggiunta (protect) passa per ultima a parità di scadenza
+            drop = len(self._keys) - int(self.max_entries * EVICT_TARGET)
+            oldest = set(heapq.nsmallest(
+                drop, range(len(self._keys)),
+                key=lambda index: (self._expiry[index], self._keys[index] == protect)
+            ))
+            self._keys = array('Q', [key for index, key in enumerate(self._keys) if index not in oldest])
+            self._expiry = array('I', [expires_at for index, expires_at in enumerate(self._expiry) if index not in oldest])
+            self.evicted += drop
+
+    def seen(self, country: str, asin: str) -> bool:
+        """True se l'ASIN è già stato visto per il paese e non è scaduto"""
+        index = self._find(pack_key(country, asin))
+        return index >= 0 and self._expiry[index] > time.time()
+
+    def add(self, country: str, asin: str):
+        """Registra (o rinnova) l'ASIN per il paese"""
+        now = int(time.time())
+        key = pack_key(country, asin)
+        index = bisect_left(self._keys, key)
+        if index < len(self._keys) and self._keys[index] == key:
+            self._expiry[index] = now + self.ttl
+        else:
+            self._keys.insert(index, key)
+            self._expiry.insert(index, now + self.ttl)
+        self._dirty = True
+
+        if len(self._keys) > self.max_entries or time.monotonic() - self._swept_at >= SWEEP_SECONDS:
+            self._expire(now, protect=key)
+
+        if time.monotonic() - self._saved_at >= self.save_interval and (
+                self._save_task is None or self._save_task.done()):
+            # Snapshot periodico: copia degli array sul loop, serializzazione e
+            # scrittura su file in un thread
+            self._save_task = asyncio.ensure_future(asyncio.to_thread(self._write, *self._snapshot()))
+
+    def stats(self) -> Dict:
+        return {'entries': len(self._keys), 'max_entries': self.max_entries, 'evicted': self.evicted}
+
+    def _snapshot(self):
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        return self._keys[:], self._expiry[:]
+
+    def _write(self, keys: array, expiry: array):
+        if not self.path:
+            return
+        try:
+            if sys.byteorder != 'little':
+                keys.byteswap()
+                expiry.byteswap()
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, len(keys)))
+                keys.tofile(f)
+                expiry.tofile(f)
+            os.replace(tmp_path, self.path)
+            logger.info(f"✅ Dedup salvato: {len(keys)} ASIN")
+        except Exception as e:
+            logger.error(f"❌ Errore salvataggio dedup: {e}")
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+            magic, count = HEADER.unpack_from(data)
+            keys, expiry = array('Q'), array('I')
+            if magic != MAGIC or len(data) != HEADER.size + count * (keys.itemsize + expiry.itemsize):
+                raise ValueError('formato non riconosciuto')
+            keys_end = HEADER.size + count * keys.itemsize
+            keys.frombytes(data[HEADER.size:keys_end])
+            expiry.frombytes(data[keys_end:])
+            if sys.byteorder != 'little':
+                keys.byteswap()
+                expiry.byteswap()
+            self._keys, self._expiry = keys, expiry
+            self._expire(int(time.time()))
+            logger.info(f"♻️ Dedup caricato: {len(self._keys)} ASIN")
+        except Exception as e:
+            logger.warning(f"⚠️ Impossibile caricare dedup: {e}")
+
+    def close(self):
+        """Salvataggio finale (shutdown)"""
+        if self._dirty:
+            self._write(*self._snapshot())
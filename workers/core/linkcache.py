@@ -0,0 +1,143 @@
+"""
+LinkCache - Cache persistente link corto → URL espanso e ASIN
+Le promo ripetute riusano gli stessi amzn.to/amzn.eu: dalla cache costano
+un lookup in un dizionario invece di una catena di redirect. Voci con TTL
+(LINK_CACHE_TTL_SECONDS), eviction LRU oltre LINK_CACHE_SIZE e cache
+negativa, più breve, per i link falliti o senza ASIN. Salvata su file
+JSON (LINK_CACHE_FILE) periodicamente e allo shutdown, ricaricata all'avvio.
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from workers.core.metrics import LINK_CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+# (URL espanso, ASIN); (None, None) per una voce negativa
+Resolution = Tuple[Optional[str], Optional[str]]
+
+
+class LinkCache:
+    """LRU con scadenza delle risoluzioni dei link corti"""
+
+    def __init__(
+        self,
+        path: str = '',
+        max_size: int = 10000,
+        ttl: float = 7 * 24 * 3600,
+        negative_ttl: float = 600,
+        save_interval: float = 300
+    ):
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.save_interval = save_interval
+
+        # url → [URL espanso, ASIN, scadenza (epoch)], dal meno al più usato
+        self._entries: 'OrderedDict[str, list]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        self._load()
+
+    @classmethod
+    def from_env(cls) -> 'LinkCache':
+        return cls(
+            path=os.getenv('LINK_CACHE_FILE', '/tmp/worker_link_cache.json'),
+            max_size=int(os.getenv('LINK_CACHE_SIZE', 10000)),
+            ttl=float(os.getenv('LINK_CACHE_TTL_SECONDS', 7 * 24 * 3600)),
+            negative_ttl=float(os.getenv('LINK_CACHE_NEGATIVE_TTL_SECONDS', 600)),
+            save_interval=float(os.getenv('LINK_CACHE_SAVE_SECONDS', 300))
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, url: str) -> Optional[Resolution]:
+        """Risoluzione in cache (anche negativa); None se assente o scaduta"""
+        entry = self._entries.get(url)
+        if entry is not None and entry[2] <= time.time():
+            del self._entries[url]
+            entry = None
+        if entry is None:
+            self.misses += 1
+            LINK_CACHE_LOOKUPS.labels('miss').inc()
+            return None
+
+        self._entries.move_to_end(url)
+        self.hits += 1
+        LINK_CACHE_LOOKUPS.labels('hit' if entry[1] else 'negative').inc()
+        return entry[0], entry[1]
+
+    def put(self, url: str, expanded_url: Optional[str], asin: Optional[str]):
+        """Salva una risoluzione; senza ASIN vale come voce negativa"""
+        ttl = self.ttl if asin else self.negative_ttl
+        self._entries[url] = [expanded_url, asin, time.time() + ttl]
+        self._entries.move_to_end(url)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        self._dirty = True
+
+        if time.monotonic() - self._saved_at >= self.save_interval:
+            # Snapshot periodico su file senza bloccare il loop
+            asyncio.get_running_loop().run_in_executor(None, self._write, self._snapshot())
+
+    @property
+    def hit_rate(self) -> Optional[float]:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else None
+
+    def stats(self) -> Dict:
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hit_rate, 3) if self.hit_rate is not None else None,
+        }
+
+    def _snapshot(self) -> Dict[str, list]:
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        return dict(self._entries)
+
+    def _write(self, entries: Dict[str, list]):
+        if not self.path:
+            return
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.path)
+            logger.info(f"✅ Cache link salvata: {len(entries)} voci")
+        except Exception as e:
+            logger.error(f"❌ Errore salvataggio cache link: {e}")
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                entries = json.load(f)
+            now = time.time()
+            # Ordine del file = ordine LRU al salvataggio
+            for url, entry in entries.items():
+                if entry[2] > now:
+                    self._entries[url] = entry
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            logger.info(f"♻️ Cache link caricata: {len(self._entries)} voci")
+        except Exception as e:
+            logger.warning(f"⚠️ Impossibile caricare cache link: {e}")
+
+    def close(self):
+        """Salvataggio finale (shutdown)"""
+        if self._dirty:
+            self._write(self._snapshot())
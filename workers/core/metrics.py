@@ -0,0 +1,37 @@
+"""
+Metriche Prometheus dei worker
+Esposte su GET /metrics dall'app HTTP di ogni worker: durata degli
+scrape, latenza delle pagine di iter_messages e di parse_message, contatori dei
+messaggi parsati e scartati.
+"""
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+SCRAPE_SECONDS = Histogram(
+    'worker_scrape_seconds',
+    'Durata della lettura del canale sorgente',
+    ['country'],
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+)
+ITER_MESSAGES_SECONDS = Histogram(
+    'worker_iter_messages_seconds',
+    'Attesa di ogni pagina di messaggi da Telethon iter_messages',
+    ['country'],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+PARSE_SECONDS = Histogram(
+    'worker_parse_message_seconds',
+    'Durata di parse_message (inclusa l\'espansione dei link corti)',
+    ['country'],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10)
+)
+
+DEALS_PARSED = Counter('worker_deals_parsed', 'Messaggi trasformati in deal', ['country'])
+DEALS_SKIPPED = Counter('worker_deals_skipped', 'Messaggi scartati', ['country', 'reason'])
+BUFFER_FULL = Counter('worker_buffer_full', 'Letture del canale rimandate per buffer pieno', ['country'])
+LINK_CACHE_LOOKUPS = Counter('worker_link_cache_lookups', 'Lookup nella cache dei link corti', ['result'])
+
+
+def render():
+    """Corpo e content type della risposta /metrics"""
+    return generate_latest(), CONTENT_TYPE_LATEST
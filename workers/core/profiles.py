@@ -0,0 +1,173 @@
+"""
+Profili di parsing per marketplace
+Un profilo sa riconoscere il link Amazon di un messaggio del canale
+sorgente, ricavarne l'ASIN, riscriverlo col nostro tag affiliato e
+ripulire il testo. Il resto (lettura del canale, dedup, push) è comune
+a tutti i paesi e vive in DealWorker. Nuovi marketplace si aggiungono
+con register_profile(). resolve() è asincrono: i link corti si espandono
+col ShortLinkResolver condiviso, senza bloccare il loop.
+"""
+
+import re
+import logging
+from typing import Callable, Dict, Optional, Tuple
+
+from common.tracing import Span, Tracer
+from workers.core.resolver import ShortLinkResolver
+
+logger = logging.getLogger(__name__)
+
+ASIN_PATTERNS = [
+    r'/dp/([A-Z0-9]{10})',
+    r'/gp/product/([A-Z0-9]{10})',
+]
+
+
+def extract_asin_from_url(url: str) -> Optional[str]:
+    """Estrae ASIN da URL Amazon"""
+    if not url:
+        return None
+
+    url_clean = url.split('?')[0].split('&')[0]
+
+    for pattern in ASIN_PATTERNS:
+        match = re.search(pattern, url_clean)
+        if match:
+            asin = match.group(1)
+            if re.match(r'^[A-Z0-9]{10}$', asin):
+                return asin
+
+    return None
+
+
+def retag_url(url: str, affiliate_tag: str) -> str:
+    """Rimuove il vecchio tag affiliato e aggiunge il nostro"""
+    new_url = re.sub(r'[?&]tag=[^&\s]+', '', url)
+    if '?' in new_url:
+        return f"{new_url}&tag={affiliate_tag}"
+    return f"{new_url}?tag={affiliate_tag}"
+
+
+class ParsingProfile:
+    """Regole di parsing di un marketplace (sottoclassi per paese)"""
+
+    country = ''
+    domain = ''
+    default_affiliate_tag = ''
+
+    def __init__(
+        self,
+        affiliate_tag: Optional[str] = None,
+        tracer: Optional[Tracer] = None,
+        resolver: Optional[ShortLinkResolver] = None
+    ):
+        self.affiliate_tag = affiliate_tag or self.default_affiliate_tag
+        self.tracer = tracer
+        self.resolver = resolver
+
+    def find_url(self, text: str) -> Optional[str]:
+        """Primo link Amazon del messaggio"""
+        match = re.search(rf'https://(?:www\.)?{re.escape(self.domain)}/[^\s\n]+', text)
+        return match.group(0) if match else None
+
+    async def resolve(self, original_url: str, parent: Optional[Span] = None) -> Optional[Tuple[str, str]]:
+        """(ASIN, URL col nostro tag) per il link trovato; None se non è un prodotto"""
+        asin = extract_asin_from_url(original_url)
+        if not asin:
+            return None
+        return asin, retag_url(original_url, self.affiliate_tag)
+
+    def clean_text(self, text: str) -> str:
+        """Ritocchi del testo oltre alla sostituzione del link"""
+        return text
+
+
+class UKProfile(ParsingProfile):
+    """@NicePriceDeals → amazon.co.uk"""
+
+    country = 'UK'
+    domain = 'amazon.co.uk'
+    default_affiliate_tag = 'ukbestdeal02-21'
+
+    def find_url(self, text: str) -> Optional[str]:
+        # Il canale UK usa sempre il dominio con www
+        match = re.search(r'https://www\.amazon\.co\.uk/[^\s\n]+', text)
+        return match.group(0) if match else None
+
+
+class ITProfile(ParsingProfile):
+    """@salvatore_aranzulla_offerte → amazon.it, anche con link corti amzn.to/amzn.eu"""
+
+    country = 'IT'
+    domain = 'amazon.it'
+    default_affiliate_tag = 'srzone00-21'
+
+    # Righe promozionali comuni
+    PROMOTIONAL_PATTERNS = [
+        r'PREZZO AL MINIMO.*?(?:COMPRA SUBITO|$)',
+        r'👉\s*AFFARE IMMEDIATO.*?(?:➡️|$)',
+        r'➡️\s*COMPRA SUBITO\s*➡️',
+        r'OFFERTA LAMPO.*?(?:\n|$)',
+        r'MINIMO STORICO.*?(?:\n|$)',
+        r'PREZZO IN PICCHIATA.*?(?:\n|$)',
+    ]
+
+    def find_url(self, text: str) -> Optional[str]:
+        # Cerca URL Amazon IT (formato lungo o corto)
+        url = super().find_url(text)
+        if url:
+            return url
+        # Cerca link corti amzn.to o amzn.eu
+        match = re.search(r'https://amzn\.(?:to|eu)/[^\s\n]+', text)
+        return match.group(0) if match else None
+
+    async def resolve(self, original_url: str, parent: Optional[Span] = None) -> Optional[Tuple[str, str]]:
+        if 'amzn.to' not in original_url and 'amzn.eu' not in original_url:
+            return await super().resolve(original_url, parent)
+
+        # Link corto: segui il redirect per ottenere l'ASIN (o riusa la cache)
+        with self.tracer.span('worker.expand_short_link', parent, url=original_url) as span:
+            expanded_url, asin = await self.resolver.resolve(original_url, extract_asin_from_url)
+            span.set(expanded_url=expanded_url, asin=asin)
+        if not asin:
+            return None
+        return asin, f"https://www.{self.domain}/dp/{asin}?tag={self.affiliate_tag}"
+
+    def clean_text(self, text: str) -> str:
+        # Sostituisci anche il link affiliate disclosure
+        text = text.replace(
+            '#affiliate: https://tecnologia.libero.it/contatti',
+            '#affiliate: https://gomining.uk/amzn'
+        )
+
+        for pattern in self.PROMOTIONAL_PATTERNS:
+            text = re.sub(pattern, '', text, flags=re.IGNORECASE)
+
+        # Pulisci spazi multipli e righe vuote
+        text = re.sub(r'\n\s*\n', '\n', text)
+        return text.strip()
+
+
+# Profili disponibili per nome (campo 'profile' di una sorgente)
+PROFILES: Dict[str, Callable[..., ParsingProfile]] = {
+    'UK': UKProfile,
+    'IT': ITProfile,
+}
+
+
+def register_profile(name: str, factory: Callable[..., ParsingProfile]):
+    """Registra un profilo per un nuovo marketplace"""
+    PROFILES[name.upper()] = factory
+
+
+def create_profile(
+    name: str,
+    affiliate_tag: Optional[str] = None,
+    tracer: Optional[Tracer] = None,
+    resolver: Optional[ShortLinkResolver] = None
+) -> ParsingProfile:
+    """Profilo per nome; ValueError se sconosciuto"""
+    factory = PROFILES.get(name.upper())
+    if factory is None:
+        raise ValueError(f"profilo di parsing sconosciuto: {name}")
+    return factory(affiliate_tag, tracer, resolver)
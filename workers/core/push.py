@@ -0,0 +1,154 @@
+"""
+Push dei deals dal worker al coordinatore
+Ogni deal appena parsato viene consegnato all'endpoint /ingest del
+coordinatore con ack e retry; quello che non viene confermato resta in
+backlog e viene restituito al prossimo /scrape (riconciliazione).
+"""
+
+import os
+import queue
+import random
+import logging
+import threading
+from typing import Dict, List, Optional
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+
+class DealPusher:
+    """Consegna asincrona (thread dedicato) dei deals al coordinatore"""
+
+    def __init__(
+        self,
+        ingest_url: str,
+        token: str = '',
+        interval: float = 30,
+        max_attempts: int = 5,
+        backoff: float = 1.0,
+        max_backoff: float = 30.0,
+        timeout: float = 10.0,
+        batch_size: int = 20
+    ):
+        self.ingest_url = ingest_url
+        self.token = token
+        self.interval = interval
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.batch_size = batch_size
+
+        self.queue: queue.Queue = queue.Queue()
+        self.pending: List[Dict] = []  # Deals non confermati, per la riconciliazione
+        self.delivered = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.session = requests.Session()
+
+    @classmethod
+    def from_env(cls) -> Optional['DealPusher']:
+        """Crea il pusher se COORDINATOR_INGEST_URL è configurato"""
+        ingest_url = os.getenv('COORDINATOR_INGEST_URL', '')
+        if not ingest_url:
+            return None
+        return cls(
+            ingest_url,
+            token=os.getenv('INGEST_TOKEN', ''),
+            interval=float(os.getenv('PUSH_INTERVAL_SECONDS', 30)),
+            max_attempts=int(os.getenv('PUSH_MAX_ATTEMPTS', 5)),
+            timeout=float(os.getenv('PUSH_TIMEOUT', 10)),
+            batch_size=int(os.getenv('PUSH_BATCH_SIZE', 20))
+        )
+
+    def start(self):
+        """Avvia il thread di consegna"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='deal-pusher', daemon=True)
+        self._thread.start()
+        logger.info(f"📡 Push attivo verso {self.ingest_url}")
+
+    def stop(self, timeout: float = 10):
+        """Ferma il thread; i deals ancora in coda passano nel backlog"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+        leftover = []
+        while True:
+            try:
+                leftover.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        if leftover:
+            with self._lock:
+                self.pending.extend(leftover)
+
+    def push(self, deal: Dict):
+        """Accoda un deal per la consegna"""
+        self.queue.put(deal)
+
+    def take_pending(self) -> List[Dict]:
+        """Restituisce (e svuota) il backlog dei deals non consegnati"""
+        with self._lock:
+            pending, self.pending = self.pending, []
+        return pending
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                batch = [self.queue.get(timeout=1)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._deliver(batch)
+
+    def _deliver(self, batch: List[Dict]):
+        """Invia un batch finché tutti i deals sono confermati o i tentativi finiscono"""
+        remaining = {deal['deal_id']: deal for deal in batch}
+        headers = {'X-Ingest-Token': self.token} if self.token else {}
+
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                response = self.session.post(
+                    self.ingest_url,
+                    json=list(remaining.values()),
+                    headers=headers,
+                    timeout=self.timeout
+                )
+                if response.status_code in (200, 202):
+                    result = response.json()
+                    for deal_id in result.get('acked', []):
+                        if remaining.pop(deal_id, None) is not None:
+                            self.delivered += 1
+                    for deal_id in result.get('rejected', []):
+                        if remaining.pop(deal_id, None) is not None:
+                            logger.warning(f"⚠️ Deal {deal_id} rifiutato dal coordinatore")
+                    # Replica senza il lease del worker: subito in backlog, lo
+                    # raccoglie il polling della replica che ha il lease
+                    deferred = [remaining.pop(deal_id) for deal_id in result.get('deferred', []) if deal_id in remaining]
+                    if deferred:
+                        with self._lock:
+                            self.pending.extend(deferred)
+                    if not remaining:
+                        return
+                else:
+                    logger.warning(f"⚠️ Push HTTP {response.status_code} (tentativo {attempt}/{self.max_attempts})")
+            except (requests.RequestException, ValueError) as e:
+                logger.warning(f"⚠️ Push fallito (tentativo {attempt}/{self.max_attempts}): {e}")
+
+            if attempt < self.max_attempts:
+                delay = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+                if self._stop.wait(delay * random.uniform(0.5, 1.0)):
+                    break
+
+        logger.error(f"❌ {len(remaining)} deals non consegnati, in attesa di riconciliazione")
+        with self._lock:
+            self.pending.extend(remaining.values())
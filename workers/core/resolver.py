@@ -0,0 +1,111 @@
+"""
+Resolver - Espansione asincrona dei link corti (amzn.to, amzn.eu)
+Una sessione aiohttp condivisa (connessioni riusate) segue i redirect
+fino all'URL Amazon completo. Le espansioni in volo sono limitate in
+totale (RESOLVER_CONCURRENCY) e per host (RESOLVER_PER_HOST), così il
+parsing di una pagina di messaggi le sovrappone senza bloccare il loop
+di Telethon e senza martellare lo shortener. Davanti alla rete c'è la
+LinkCache: un link già visto (anche fallito) non viene richiesto di
+nuovo, e più richieste contemporanee per lo stesso link ne fanno una sola.
+"""
+
+import os
+import asyncio
+import logging
+from typing import Callable, Dict, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from workers.core.linkcache import LinkCache, Resolution
+
+logger = logging.getLogger(__name__)
+
+
+class ShortLinkResolver:
+    """Segue i redirect di un link corto e restituisce l'URL finale"""
+
+    def __init__(
+        self,
+        concurrency: int = 10,
+        per_host: int = 4,
+        timeout: float = 5.0,
+        cache: Optional[LinkCache] = None
+    ):
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.cache = cache
+        # Risoluzioni in corso per link, condivise da chi chiede lo stesso link
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+        self.session: Optional[aiohttp.ClientSession] = None
+        self._slots = asyncio.Semaphore(concurrency)
+        self._host_slots: Dict[str, asyncio.Semaphore] = {}
+
+    @classmethod
+    def from_env(cls) -> 'ShortLinkResolver':
+        return cls(
+            concurrency=int(os.getenv('RESOLVER_CONCURRENCY', 10)),
+            per_host=int(os.getenv('RESOLVER_PER_HOST', 4)),
+            timeout=float(os.getenv('RESOLVER_TIMEOUT', 5)),
+            cache=LinkCache.from_env()
+        )
+
+    def _session(self) -> aiohttp.ClientSession:
+        # Creata sul loop in esecuzione al primo uso
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.per_host, ttl_dns_cache=300)
+            self.session = aiohttp.ClientSession(connector=connector)
+        return self.session
+
+    async def expand(self, url: str) -> str:
+        """URL finale dopo i redirect; solleva eccezione su errore o timeout"""
+        host = urlsplit(url).hostname or ''
+        host_slots = self._host_slots.setdefault(host, asyncio.Semaphore(self.per_host))
+
+        # Il timeout conta solo la richiesta, non l'attesa di uno slot libero
+        async with self._slots, host_slots:
+            async with asyncio.timeout(self.timeout):
+                async with self._session().head(url, allow_redirects=True) as response:
+                    return str(response.url)
+
+    async def resolve(self, url: str, extract_asin: Callable[[str], Optional[str]]) -> Resolution:
+        """(URL espanso, ASIN) del link corto, dalla cache se possibile;
+        (None, None) se l'espansione fallisce o l'URL non contiene un ASIN"""
+        if self.cache is not None:
+            cached = self.cache.get(url)
+            if cached is not None:
+                return cached
+
+        # Un solo task per link, di nessun chiamante: chi viene annullato (stream
+        # chiuso) smette di aspettare, gli altri ricevono comunque il risultato
+        task = self._inflight.get(url)
+        if task is None:
+            task = self._inflight[url] = asyncio.ensure_future(self._resolve(url, extract_asin))
+        return await asyncio.shield(task)
+
+    async def _resolve(self, url: str, extract_asin: Callable[[str], Optional[str]]) -> Resolution:
+        try:
+            try:
+                expanded_url = await self.expand(url)
+            except Exception as e:
+                logger.error(f"Errore espansione link corto {url}: {e}")
+                expanded_url = None
+            asin = extract_asin(expanded_url) if expanded_url else None
+            if not asin and expanded_url:
+                logger.debug(f"ASIN non trovato dopo espansione: {expanded_url}")
+
+            if self.cache is not None:
+                self.cache.put(url, expanded_url, asin)
+            return expanded_url, asin
+        finally:
+            del self._inflight[url]
+
+    async def close(self):
+        for task in list(self._inflight.values()):
+            task.cancel()
+        if self.session and not self.session.closed:
+            await self.session.close()
+        if self.cache is not None:
+            self.cache.close()
@@ -0,0 +1,332 @@
+"""
+WorkerRuntime - Un solo processo per tutti i canali sorgente
+Un event loop su cui girano sia Telethon sia il server HTTP aiohttp,
+una connessione Telethon autorizzata, tracer e pusher condivisi da tutte
+le sorgenti (DealWorker). Aggiungere un marketplace è una voce di
+configurazione, non un nuovo interprete.
+
+Modalità live (WORKER_LIVE=1, default): un handler NewMessage sui canali
+sorgente parsa ogni messaggio appena arriva; un controllo periodico
+rifà il catch-up dall'ultimo message_id alla riconnessione e ogni
+WORKER_CATCHUP_SECONDS, così nessun messaggio va perso.
+
+Sorgenti da WORKER_SOURCES (file JSON):
+    {"session": "/tmp/session_uk",
+     "sources": [{"country": "UK", "source_channel_id": -100..., "profile": "UK",
+                  "affiliate_tag": "...", "publish_channel_id": -100...}]}
+Senza file restano UK e IT (WORKER_COUNTRIES) con le variabili d'ambiente storiche.
+"""
+
+import os
+import json
+import asyncio
+import logging
+import time
+import signal
+from typing import Dict, List, Optional
+
+from aiohttp import web
+from telethon import TelegramClient, events
+
+from common.tracing import Tracer
+from workers.core.dedup import DedupStore
+from workers.core.profiles import create_profile
+from workers.core.push import DealPusher
+from workers.core.resolver import ShortLinkResolver
+from workers.core.server import create_worker_app
+from workers.core.worker import DealWorker
+
+logger = logging.getLogger(__name__)
+
+
+def env_sources(countries: Optional[List[str]] = None) -> List[Dict]:
+    """Sorgenti UK e IT configurate da variabili d'ambiente (senza WORKER_SOURCES)"""
+    defaults = {
+        'UK': {
+            'country': 'UK',
+            'source_channel_id': int(os.getenv('SOURCE_CHANNEL_ID', -1001303541715)),
+            'publish_channel_id': int(os.getenv('PUBLISH_CHANNEL_ID', -1001232723285)),
+        },
+        'IT': {
+            'country': 'IT',
+            'source_channel_id': int(os.getenv('SOURCE_CHANNEL_IT_ID', -1001771623915)),
+            'publish_channel_id': int(os.getenv('PUBLISH_CHANNEL_IT_ID', -1001080585126)),
+        },
+    }
+    if countries is None:
+        countries = [c.strip().upper() for c in os.getenv('WORKER_COUNTRIES', 'UK,IT').split(',') if c.strip()]
+    return [defaults[country] for country in countries if country in defaults]
+
+
+def parse_sources(data: Dict) -> List[Dict]:
+    """Valida la lista di sorgenti del file WORKER_SOURCES"""
+    entries = data.get('sources')
+    if not isinstance(entries, list) or not entries:
+        raise ValueError("il file sorgenti deve contenere una lista 'sources' non vuota")
+
+    sources = []
+    seen = set()
+    for index, entry in enumerate(entries):
+        country = str(entry.get('country', '')).upper()
+        if not country or not entry.get('source_channel_id'):
+            raise ValueError(f"voce {index}: 'country' e 'source_channel_id' sono obbligatori")
+        if country in seen:
+            raise ValueError(f"voce {index}: sorgente {country} duplicata")
+        seen.add(country)
+        if not entry.get('enabled', True):
+            continue
+        source = {'country': country, 'source_channel_id': int(entry['source_channel_id'])}
+        if entry.get('publish_channel_id'):
+            source['publish_channel_id'] = int(entry['publish_channel_id'])
+        for key in ('profile', 'affiliate_tag'):
+            if entry.get(key):
+                source[key] = str(entry[key])
+        sources.append(source)
+    return sources
+
+
+class WorkerRuntime:
+    """Processo worker: loop, Telethon e push condivisi tra le sorgenti"""
+
+    def __init__(self, countries: Optional[List[str]] = None):
+        self.session_path = os.getenv('TELEGRAM_SESSION', '/tmp/session_uk')
+
+        sources_file = os.getenv('WORKER_SOURCES', '')
+        if sources_file:
+            with open(sources_file, 'r') as f:
+                data = json.load(f)
+            sources = parse_sources(data)
+            self.session_path = data.get('session', self.session_path)
+        else:
+            sources = env_sources(countries)
+        if countries is not None:
+            # Solo le sorgenti richieste (avvii storici per paese)
+            sources = [source for source in sources if source['country'] in countries]
+
+        # Telethon client
+        self.api_id = int(os.getenv('TELEGRAM_API_ID', '0'))
+        self.api_hash = os.getenv('TELEGRAM_API_HASH', '')
+        self.phone = os.getenv('TELEGRAM_PHONE', '')
+
+        self.telethon_client = None
+        self.telethon_connected = False
+        self._telethon_lock = asyncio.Lock()
+
+        # Server HTTP sullo stesso loop di Telethon
+        self.http_host = os.getenv('WORKER_HOST', '0.0.0.0')
+        self.http_port = int(os.getenv('WORKER_PORT', 8001))
+        self.http_runner: Optional[web.AppRunner] = None
+
+        self.stopping = asyncio.Event()
+        self.shutdown_timeout = float(os.getenv('SHUTDOWN_TIMEOUT', 20))
+        self.push_task: Optional[asyncio.Task] = None
+
+        # Ingestion live dagli eventi Telethon, catch-up alla riconnessione
+        self.live = os.getenv('WORKER_LIVE', '1') == '1'
+        self.live_active = False
+        self.catchup_interval = float(os.getenv('WORKER_CATCHUP_SECONDS', 60))
+        self.watch_interval = float(os.getenv('WORKER_WATCH_SECONDS', 5))
+        self.live_task: Optional[asyncio.Task] = None
+
+        # Push verso il coordinatore (opzionale, COORDINATOR_INGEST_URL)
+        self.pusher = DealPusher.from_env()
+
+        # Span di scrape e parse, collegati alla chiamata del coordinatore
+        self.tracer = Tracer.from_env('worker')
+
+        # ASIN già visti per paese, persistiti tra un riavvio e l'altro
+        self.dedup = DedupStore.from_env()
+
+        # Espansione dei link corti condivisa da tutti i profili
+        self.resolver = ShortLinkResolver.from_env()
+
+        self.workers: Dict[str, DealWorker] = {}
+        for source in sources:
+            profile = create_profile(
+                source.get('profile', source['country']), source.get('affiliate_tag'), self.tracer, self.resolver
+            )
+            self.workers[source['country']] = DealWorker(self, source, profile)
+
+        self.by_channel: Dict[int, DealWorker] = {worker.source_channel_id: worker for worker in self.workers.values()}
+
+        logger.info(f"🤖 Worker runtime inizializzato: {', '.join(self.workers) or 'nessuna sorgente'}")
+        logger.info(f"Telethon API ID: {self.api_id}, Phone: {self.phone}, Session: {self.session_path}")
+
+    def get(self, country: str) -> Optional[DealWorker]:
+        return self.workers.get(country.upper())
+
+    async def init_telethon(self):
+        """Inizializza Telethon con sessione pre-autenticata (una connessione per tutte le sorgenti)"""
+        async with self._telethon_lock:
+            if self.telethon_connected:
+                return
+            await self._connect_telethon()
+
+    async def _connect_telethon(self):
+        try:
+            if not self.api_id or self.api_id == 0:
+                logger.warning("Telethon non configurato (API_ID = 0)")
+                return
+
+            logger.info("🔗 Inizializzazione Telethon con sessione esistente...")
+            logger.info(f"API ID: {self.api_id}, API Hash: {self.api_hash[:10]}..., Phone: {self.phone}")
+
+            # Verifica se il file di sessione esiste
+            session_file = f"{self.session_path}.session"
+            if os.path.exists(session_file):
+                logger.info(f"✅ File sessione trovato: {session_file}")
+            else:
+                logger.error(f"❌ File sessione NON trovato: {session_file}")
+                self.telethon_connected = False
+                return
+
+            self.telethon_client = TelegramClient(self.session_path, self.api_id, self.api_hash)
+
+            # Connetti usando la sessione esistente (non richiede verifica)
+            logger.info("Connessione a Telegram...")
+            await self.telethon_client.connect()
+            logger.info("Connessione stabilita, verifica autorizzazione...")
+
+            if await self.telethon_client.is_user_authorized():
+                self.telethon_connected = True
+                me = await self.telethon_client.get_me()
+                logger.info(f"✅ Telethon connesso con successo - User: {me.first_name} (@{me.username})")
+            else:
+                logger.error("❌ Sessione non autorizzata")
+                self.telethon_connected = False
+
+        except Exception as e:
+            logger.error(f"❌ Errore inizializzazione Telethon: {e}")
+            import traceback
+            logger.error(traceback.format_exc())
+            self.telethon_connected = False
+
+    def collect_pending(self):
+        """Riporta nel backlog della propria sorgente i deals che il push non ha consegnato"""
+        if not self.pusher:
+            return
+        for deal in self.pusher.take_pending():
+            worker = self.get(deal.get('country', ''))
+            if worker:
+                worker.buffer(deal)
+
+    async def on_new_message(self, event):
+        """Handler NewMessage: il messaggio va alla sorgente del suo canale"""
+        worker = self.by_channel.get(event.chat_id)
+        if worker:
+            await worker.on_message(event.message)
+
+    async def catch_up(self):
+        """Catch-up di tutte le sorgenti dall'ultimo message_id"""
+        await asyncio.gather(*(worker.catch_up() for worker in self.workers.values()))
+
+    async def live_loop(self):
+        """Connessione, registrazione dell'handler live e catch-up: alla prima
+        connessione, a ogni riconnessione e comunque ogni WORKER_CATCHUP_SECONDS"""
+        caught_up_at: Optional[float] = None
+
+        while not self.stopping.is_set():
+            try:
+                if not self.telethon_connected:
+                    await self.init_telethon()
+
+                client = self.telethon_client
+                if client and self.telethon_connected:
+                    if not self.live_active:
+                        client.add_event_handler(self.on_new_message, events.NewMessage(chats=list(self.by_channel)))
+                        self.live_active = True
+                        logger.info(f"⚡ Ingestion live attiva su {len(self.by_channel)} canali")
+
+                    if not client.is_connected():
+                        if caught_up_at is not None:
+                            logger.warning("📴 Telethon disconnesso: catch-up alla riconnessione")
+                        caught_up_at = None
+                        await client.connect()
+                    elif caught_up_at is None or time.monotonic() - caught_up_at >= self.catchup_interval:
+                        await self.catch_up()
+                        caught_up_at = time.monotonic()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Errore ingestion live: {e}")
+
+            await asyncio.sleep(self.watch_interval)
+
+    async def push_loop(self):
+        """Push: scrape periodico di tutte le sorgenti e consegna immediata dei nuovi deals"""
+        logger.info(f"📡 Push ogni {self.pusher.interval}s verso {self.pusher.ingest_url}")
+
+        while not self.stopping.is_set():
+            try:
+                if not self.telethon_connected:
+                    await self.init_telethon()
+
+                await asyncio.gather(*(worker.push_once() for worker in self.workers.values()))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Errore push loop: {e}")
+
+            await asyncio.sleep(self.pusher.interval)
+
+    async def start_http_server(self):
+        """Avvia il server HTTP (/<paese>/scrape, /health, /stats, /metrics)"""
+        self.http_runner = web.AppRunner(create_worker_app(self))
+        await self.http_runner.setup()
+        site = web.TCPSite(self.http_runner, self.http_host, self.http_port)
+        await site.start()
+        logger.info(f"🌐 Server HTTP su {self.http_host}:{self.http_port}")
+
+    async def drain(self):
+        """Shutdown graduale: niente nuovi scrape, attesa di quelli in corso,
+        backlog e ultimo message_id di ogni sorgente salvati su disco"""
+        self.stopping.set()
+        for task in (self.push_task, self.live_task):
+            if task:
+                task.cancel()
+
+        await asyncio.gather(*(worker.drain(self.shutdown_timeout) for worker in self.workers.values()))
+
+        if self.telethon_client and self.telethon_connected:
+            await self.telethon_client.disconnect()
+            self.telethon_connected = False
+            logger.info("🔌 Telethon disconnesso")
+
+        if self.pusher:
+            await asyncio.to_thread(self.pusher.stop, self.shutdown_timeout)
+            self.collect_pending()
+
+        for worker in self.workers.values():
+            worker._save_backlog()
+            worker._save_state()
+
+    async def run(self):
+        """Avvia il worker e resta attivo fino a SIGTERM/SIGINT"""
+        # Connessione Telethon all'avvio: condivisa da tutte le sorgenti
+        await self.init_telethon()
+
+        # Push verso il coordinatore: in modalità live i deals partono appena
+        # arriva il messaggio, altrimenti con lo scrape periodico
+        if self.pusher:
+            self.pusher.start()
+        if self.live:
+            self.live_task = asyncio.create_task(self.live_loop())
+        elif self.pusher:
+            self.push_task = asyncio.create_task(self.push_loop())
+
+        await self.start_http_server()
+
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.stopping.set)
+
+        try:
+            await self.stopping.wait()
+            logger.info("🛑 Shutdown graduale")
+            await self.drain()
+        finally:
+            if self.http_runner:
+                await self.http_runner.cleanup()
+            await self.resolver.close()
+            self.dedup.close()
+            self.tracer.close()
@@ -0,0 +1,131 @@
+"""
+Server - Endpoint HTTP del worker sullo stesso event loop di Telethon
+Gli handler aiohttp chiamano direttamente gli scrape asincroni delle
+sorgenti: richieste concorrenti a /scrape, /health e /stats non
+richiedono thread né loop dedicati. Ogni sorgente ha i suoi endpoint
+sotto /<paese>/; /health e /metrics sono del processo.
+"""
+
+import json
+import logging
+from contextlib import aclosing
+from datetime import datetime
+from typing import TYPE_CHECKING, Optional
+
+from aiohttp import web
+
+from common.tracing import TRACEPARENT_HEADER
+from workers.core.metrics import render as render_metrics
+from workers.core.worker import DealWorker
+
+if TYPE_CHECKING:
+    from workers.core.runtime import WorkerRuntime
+
+logger = logging.getLogger(__name__)
+
+
+def create_worker_app(runtime: 'WorkerRuntime') -> web.Application:
+    """Crea l'app aiohttp con /<paese>/scrape, /health, /stats e /metrics"""
+
+    def source(request: web.Request) -> Optional[DealWorker]:
+        # Sorgente del paese; senza paese l'unica configurata (route storiche)
+        country = request.match_info.get('country')
+        if country:
+            return runtime.get(country)
+        if len(runtime.workers) == 1:
+            return next(iter(runtime.workers.values()))
+        return None
+
+    def not_configured(request: web.Request) -> web.Response:
+        country = request.match_info.get('country', '?')
+        return web.json_response({'error': f"sorgente {country} non configurata"}, status=404)
+
+    async def stream_deals(request: web.Request, worker: DealWorker, limit: Optional[int], traceparent: Optional[str]):
+        """NDJSON: ogni deal viene scritto appena parse_message lo produce"""
+        response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+        await response.prepare(request)
+        count = 0
+        try:
+            async with aclosing(worker.iter_scrape(limit, traceparent)) as deals:
+                async for deal in deals:
+                    await response.write((json.dumps(deal, ensure_ascii=False) + '\n').encode())
+                    count += 1
+            await response.write_eof()
+        finally:
+            logger.info(f"📊 Endpoint /{worker.country.lower()}/scrape (stream): {count} deals")
+        return response
+
+    async def scrape(request: web.Request) -> web.StreamResponse:
+        worker = source(request)
+        if not worker:
+            return not_configured(request)
+
+        # Shutdown in corso: il coordinatore riproverà più tardi
+        if runtime.stopping.is_set():
+            return web.json_response({'error': 'shutdown in corso'}, status=503)
+
+        # Copia hedge di uno scrape già in corso o servito
+        if not worker.claim_scrape_id(request.headers.get('X-Scrape-Id')):
+            return web.json_response({'error': 'scrape già servito'}, status=409)
+
+        # ?limit=N: finestra di fetch decisa dal coordinatore (backpressure)
+        try:
+            limit = int(request.query['limit']) if 'limit' in request.query else None
+        except ValueError:
+            limit = None
+
+        # Contesto di tracing della chiamata del coordinatore
+        traceparent = request.headers.get(TRACEPARENT_HEADER)
+
+        try:
+            # ?stream=1: un deal per riga (NDJSON)
+            if request.query.get('stream') == '1':
+                return await stream_deals(request, worker, limit, traceparent)
+
+            deals = await worker.scrape_channel(limit, traceparent)
+            logger.info(f"📊 Endpoint /{worker.country.lower()}/scrape: {len(deals)} deals")
+            return web.json_response(deals, dumps=lambda data: json.dumps(data, ensure_ascii=False))
+
+        except ConnectionResetError:
+            # Il coordinatore ha chiuso lo stream (timeout o hedge vincente)
+            raise
+        except Exception as e:
+            logger.error(f"Errore /scrape: {e}")
+            import traceback
+            logger.error(traceback.format_exc())
+            return web.json_response({'error': str(e)}, status=500)
+
+    async def health(request: web.Request) -> web.Response:
+        if request.match_info.get('country') and not source(request):
+            return not_configured(request)
+        return web.json_response({
+            'status': 'healthy',
+            'worker': 'DealScout',
+            'sources': list(runtime.workers),
+            'telethon_connected': runtime.telethon_connected,
+            'link_cache': runtime.resolver.cache.stats() if runtime.resolver.cache else None,
+            'dedup': runtime.dedup.stats(),
+            'timestamp': datetime.now().isoformat()
+        })
+
+    async def stats(request: web.Request) -> web.Response:
+        if request.match_info.get('country'):
+            worker = source(request)
+            if not worker:
+                return not_configured(request)
+            return web.json_response(worker.stats())
+        return web.json_response({code: worker.stats() for code, worker in runtime.workers.items()})
+
+    async def metrics(request: web.Request) -> web.Response:
+        body, content_type = render_metrics()
+        return web.Response(body=body, headers={'Content-Type': content_type})
+
+    app = web.Application()
+    app.router.add_get('/metrics', metrics)
+    app.router.add_get('/health', health)
+    app.router.add_get('/stats', stats)
+    app.router.add_get('/scrape', scrape)
+    app.router.add_get('/{country}/health', health)
+    app.router.add_get('/{country}/stats', stats)
+    app.router.add_get('/{country}/scrape', scrape)
+    return app
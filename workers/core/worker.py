@@ -0,0 +1,478 @@
+"""
+DealWorker - Lettura di un canale sorgente per un marketplace
+Codice comune ai worker UK e IT: stato dell'ultimo messaggio, buffer dei
+deals pronti, scrape Telethon con tracing e metriche, streaming con limite.
+In modalità live ogni nuovo messaggio del canale viene parsato appena
+arriva (evento NewMessage) e il deal finisce nel buffer o in push: /scrape
+risponde dalla memoria. Il passaggio di catch-up dall'ultimo message_id
+recupera i messaggi persi durante una disconnessione: legge in avanti a
+pagine, dal più vecchio, fino all'ultimo messaggio del canale, e salva
+last_message_id a ogni pagina consegnata.
+Il parsing specifico del paese è delegato al ParsingProfile; connessione
+Telethon, event loop e push sono condivisi tra le sorgenti del WorkerRuntime.
+"""
+
+import os
+import time
+import json
+import asyncio
+import logging
+from collections import deque
+from contextlib import aclosing
+from datetime import datetime
+from typing import TYPE_CHECKING, AsyncIterator, Dict, List, Optional
+
+from telethon.errors import FloodWaitError
+
+from common.tracing import Span
+from workers.core.metrics import (
+    BUFFER_FULL, DEALS_PARSED, DEALS_SKIPPED, ITER_MESSAGES_SECONDS, PARSE_SECONDS, SCRAPE_SECONDS
+)
+from workers.core.profiles import ParsingProfile
+
+if TYPE_CHECKING:
+    from workers.core.runtime import WorkerRuntime
+
+logger = logging.getLogger(__name__)
+
+
+class DealWorker:
+    """Una sorgente: canale Telegram da cui copiare i deals di un paese"""
+
+    def __init__(self, runtime: 'WorkerRuntime', config: Dict, profile: ParsingProfile):
+        self.runtime = runtime
+        self.country = config['country']
+        self.source_channel_id = config['source_channel_id']
+        self.publish_channel_id = config.get('publish_channel_id')
+        self.profile = profile
+        self.affiliate_tag = profile.affiliate_tag
+
+        self.last_scrape_time = None
+        self.last_message_id = 0  # Traccia l'ultimo messaggio processato
+        # Messaggi live già processati oltre last_message_id: il watermark avanza
+        # solo col catch-up, che legge il canale senza buchi
+        self.seen_ids = set()
+
+        # Carica l'ultimo message_id dal file se esiste
+        self.state_file = f"/tmp/worker_{self.country.lower()}_state.txt"
+        self._load_state()
+
+        self.scrape_lock = asyncio.Lock()
+
+        # Lettura del canale a pagine da last_message_id, a ritmo limitato
+        self.page_size = int(os.getenv('WORKER_CATCHUP_BATCH', 100))
+        self.page_delay = float(os.getenv('WORKER_CATCHUP_PAGE_DELAY', 1.0))
+        # Primo avvio senza state: solo gli ultimi messaggi, non tutta la storia
+        self.bootstrap_messages = int(os.getenv('WORKER_CATCHUP_BOOTSTRAP', 5))
+        # Pagine lette per /scrape: la risposta resta entro il timeout del
+        # coordinatore (WORKER_TIMEOUT, 30s), il resto al prossimo scrape
+        self.scrape_max_pages = max(1, int(os.getenv('WORKER_SCRAPE_MAX_PAGES', 10)))
+        # Messaggi parsati in parallelo (espansioni dei link corti sovrapposte)
+        self.parse_window = max(1, int(os.getenv('WORKER_PARSE_CONCURRENCY', 10)))
+
+        # Buffer dei deals pronti ma non ancora consegnati (eventi live, push
+        # falliti): pieno, si smette di leggere il canale invece di scartare
+        # e last_message_id resta sul primo messaggio non consegnato
+        self.backlog: deque = deque()
+        self.buffer_size = int(os.getenv('WORKER_BUFFER_SIZE', 500))
+
+        # Shutdown graduale: il backlog viene salvato su file e ripreso all'avvio
+        self.backlog_file = f"/tmp/worker_{self.country.lower()}_backlog.json"
+        self._load_backlog()
+
+        # Id degli scrape già serviti: una richiesta hedge duplicata riceve 409
+        self.scrape_ids: deque = deque(maxlen=100)
+
+        logger.info(f"🤖 Sorgente {self.country} ({type(profile).__name__}): canale {self.source_channel_id}")
+        logger.info(f"📍 Ultimo message_id {self.country}: {self.last_message_id}")
+
+    @property
+    def tracer(self):
+        return self.runtime.tracer
+
+    def claim_scrape_id(self, scrape_id: Optional[str]) -> bool:
+        """Registra l'id dello scrape; False se la stessa richiesta è già stata servita"""
+        if not scrape_id:
+            return True
+        if scrape_id in self.scrape_ids:
+            return False
+        self.scrape_ids.append(scrape_id)
+        return True
+
+    def _load_state(self):
+        """Carica lo stato dall'ultimo scraping"""
+        try:
+            if os.path.exists(self.state_file):
+                with open(self.state_file, 'r') as f:
+                    self.last_message_id = int(f.read().strip())
+                logger.info(f"✅ State {self.country} caricato: last_message_id={self.last_message_id}")
+        except Exception as e:
+            logger.warning(f"⚠️ Impossibile caricare state {self.country}: {e}")
+            self.last_message_id = 0
+
+    def _save_state(self):
+        """Salva lo stato per il prossimo scraping"""
+        try:
+            with open(self.state_file, 'w') as f:
+                f.write(str(self.last_message_id))
+            logger.info(f"✅ State {self.country} salvato: last_message_id={self.last_message_id}")
+        except Exception as e:
+            logger.error(f"❌ Errore salvataggio state {self.country}: {e}")
+
+    def _load_backlog(self):
+        """Riprende i deals non consegnati salvati allo shutdown precedente"""
+        try:
+            if os.path.exists(self.backlog_file):
+                with open(self.backlog_file, 'r') as f:
+                    self.backlog.extend(json.load(f))
+                os.remove(self.backlog_file)
+                logger.info(f"♻️ Backlog {self.country} ripreso: {len(self.backlog)} deals")
+        except Exception as e:
+            logger.warning(f"⚠️ Impossibile caricare backlog {self.country}: {e}")
+
+    def _save_backlog(self):
+        """Salva su file i deals non ancora consegnati al coordinatore"""
+        if not self.backlog:
+            return
+        try:
+            with open(self.backlog_file, 'w') as f:
+                json.dump(list(self.backlog), f, ensure_ascii=False)
+            logger.info(f"✅ Backlog {self.country} salvato: {len(self.backlog)} deals")
+        except Exception as e:
+            logger.error(f"❌ Errore salvataggio backlog {self.country}: {e}")
+
+    @property
+    def buffer_room(self) -> int:
+        """Deals che il buffer può ancora accettare prima di fermare la lettura"""
+        return max(0, self.buffer_size - len(self.backlog))
+
+    def buffer(self, deal: Dict):
+        """Accoda un deal pronto nel buffer (mai scartato: è già oltre last_message_id)"""
+        self.backlog.append(deal)
+
+    def deliver(self, deal: Dict):
+        """Deal pronto in modalità live: push al coordinatore se attivo, altrimenti buffer"""
+        if self.runtime.pusher:
+            self.runtime.pusher.push(deal)
+        else:
+            self.buffer(deal)
+
+    async def parse_message(self, text: str, parent: Optional[Span] = None) -> Optional[Dict]:
+        """Copia il messaggio e sostituisce solo il tag affiliato"""
+        try:
+            if not text or len(text.strip()) < 10:
+                return None
+
+            original_url = self.profile.find_url(text)
+            if not original_url:
+                return None
+
+            resolved = await self.profile.resolve(original_url, parent)
+            if not resolved:
+                return None
+            asin, new_url = resolved
+
+            # Evita duplicati (stesso ASIN nello stesso paese entro DEDUP_TTL_SECONDS);
+            # l'ASIN viene registrato solo alla consegna (claim_asin)
+            if self.runtime.dedup.seen(self.country, asin):
+                return None
+
+            # Sostituisci l'URL nel testo
+            new_text = self.profile.clean_text(text.replace(original_url, new_url))
+
+            # Costruisci deal con il messaggio completo
+            deal = {
+                'asin': asin,
+                'message_text': new_text,
+                'original_url': original_url,
+                'affiliate_url': new_url,
+                'country': self.country,
+                'scraped_at': datetime.now().isoformat()
+            }
+
+            logger.info(f"✅ Messaggio {self.country} copiato: {asin} (da {original_url})")
+            return deal
+
+        except Exception as e:
+            logger.error(f"❌ Errore parsing {self.country}: {e}")
+            import traceback
+            logger.error(traceback.format_exc())
+
+        return None
+
+    def claim_asin(self, deal: Dict) -> bool:
+        """Registra l'ASIN del deal che sta per essere consegnato; False se già
+        consegnato (anche da un parse sovrapposto dello stesso ASIN)"""
+        if self.runtime.dedup.seen(self.country, deal['asin']):
+            DEALS_SKIPPED.labels(self.country, 'duplicate').inc()
+            return False
+        self.runtime.dedup.add(self.country, deal['asin'])
+        return True
+
+    async def make_deal(self, message, parent: Optional[Span] = None) -> Optional[Dict]:
+        """Deal da un messaggio del canale (None se non è un'offerta), con metriche e span"""
+        if not message.text:
+            DEALS_SKIPPED.labels(self.country, 'no_text').inc()
+            return None
+
+        with PARSE_SECONDS.labels(self.country).time(), \
+                self.tracer.span('worker.parse_message', parent, message_id=message.id) as parse_span:
+            deal = await self.parse_message(message.text, parse_span)
+            parse_span.set(parsed=deal is not None)
+        if not deal:
+            DEALS_SKIPPED.labels(self.country, 'not_parsed').inc()
+            return None
+
+        DEALS_PARSED.labels(self.country).inc()
+        deal['message_id'] = message.id
+        deal['deal_id'] = f"{self.country}:{message.id}"
+        deal['traceparent'] = parse_span.traceparent
+        return deal
+
+    async def on_message(self, message):
+        """Evento NewMessage: parse immediato e consegna del deal"""
+        async with self.scrape_lock:
+            if message.id <= self.last_message_id or message.id in self.seen_ids:
+                DEALS_SKIPPED.labels(self.country, 'already_processed').inc()
+                return
+            if not self.runtime.pusher and not self.buffer_room:
+                # Buffer pieno: il messaggio resta nel canale, lo rilegge il catch-up
+                BUFFER_FULL.labels(self.country).inc()
+                logger.warning(f"⚠️ Buffer {self.country} pieno ({self.buffer_size}): messaggio {message.id} al prossimo catch-up")
+                return
+            self.seen_ids.add(message.id)
+            deal = await self.make_deal(message)
+            if deal and not self.claim_asin(deal):
+                deal = None
+        if deal:
+            logger.info(f"⚡ Deal {self.country} live: {deal['asin']} (messaggio {message.id})")
+            self.deliver(deal)
+
+    async def catch_up(self) -> int:
+        """Legge il canale da last_message_id (riconnessione o controllo periodico)
+        e consegna i deals che gli eventi live non hanno portato; senza push
+        legge solo quanto entra nel buffer"""
+        delivered = 0
+        limit = None if self.runtime.pusher else self.buffer_room
+        if limit == 0:
+            BUFFER_FULL.labels(self.country).inc()
+            logger.warning(f"⚠️ Buffer {self.country} pieno ({self.buffer_size}): catch-up rimandato")
+            return delivered
+        async with self.scrape_lock, aclosing(self.iter_channel_telethon(limit=limit)) as deals:
+            async for deal in deals:
+                self.deliver(deal)
+                delivered += 1
+        if delivered:
+            logger.info(f"🔁 Catch-up {self.country}: {delivered} deals recuperati")
+        return delivered
+
+    async def iter_new_messages(self, client, max_pages: Optional[int] = None) -> AsyncIterator[List]:
+        """Pagine di messaggi successivi a last_message_id, dal più vecchio, da
+        WORKER_CATCHUP_BATCH con una pausa tra le pagine: anche dopo una lunga
+        disconnessione il recupero non supera i limiti di Telegram. Con
+        max_pages si ferma prima della testa del canale (riprende al giro dopo)"""
+        min_id = self.last_message_id
+        if not min_id:
+            latest = [message async for message in client.iter_messages(self.source_channel_id, limit=self.bootstrap_messages)]
+            if not latest:
+                return
+            min_id = min(message.id for message in latest) - 1
+
+        pages = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                page = [
+                    message async for message in client.iter_messages(
+                        self.source_channel_id, min_id=min_id, reverse=True, limit=self.page_size
+                    )
+                ]
+            except FloodWaitError as e:
+                logger.warning(f"⏳ Flood wait {self.country}: catch-up in pausa per {e.seconds}s")
+                await asyncio.sleep(e.seconds)
+                continue
+            ITER_MESSAGES_SECONDS.labels(self.country).observe(time.perf_counter() - started)
+
+            if page:
+                yield page
+            pages += 1
+            if len(page) < self.page_size:
+                break
+
+            # Non ancora in testa al canale: pagina successiva dopo la pausa
+            min_id = page[-1].id
+            if max_pages is not None and pages >= max_pages:
+                logger.info(f"📄 Catch-up {self.country}: {pages} pagine fino al messaggio {min_id}, il resto al prossimo scrape")
+                break
+            logger.info(f"📄 Catch-up {self.country}: pagina {pages} fino al messaggio {min_id}")
+            await asyncio.sleep(self.page_delay)
+
+    def _commit(self, message_id: int):
+        """Avanza e salva last_message_id fin dove i deals sono stati consegnati"""
+        if message_id <= self.last_message_id:
+            return
+        self.last_message_id = message_id
+        self._save_state()
+        self.seen_ids = {seen_id for seen_id in self.seen_ids if seen_id > message_id}
+
+    async def iter_channel_telethon(
+        self,
+        traceparent: Optional[str] = None,
+        limit: Optional[int] = None,
+        max_pages: Optional[int] = None
+    ) -> AsyncIterator[Dict]:
+        """Scrape con Telethon: produce ogni deal appena parsato (al massimo `limit`).
+        last_message_id avanza solo oltre i deals consegnati (chi consuma ha chiesto
+        il successivo) ed è salvato a ogni pagina: uno stream interrotto dal
+        coordinatore riprende da lì al giro dopo invece di ricominciare"""
+        deals_found = 0
+        message_count = 0
+        span = self.tracer.span('worker.scrape_channel', traceparent, country=self.country)
+        client = self.runtime.telethon_client
+        # Parse in corso, nell'ordine dei messaggi (None se già processato)
+        parsing: deque = deque()
+        delivered_id = self.last_message_id
+
+        def start(message):
+            nonlocal message_count
+            message_count += 1
+
+            # Salta messaggi già processati (anche dagli eventi live)
+            if message.id <= self.last_message_id or message.id in self.seen_ids:
+                logger.info(f"⏭️ Messaggio {self.country} {message.id} già processato, skip")
+                DEALS_SKIPPED.labels(self.country, 'already_processed').inc()
+                return message.id, None
+
+            if message_count <= 3:
+                logger.info(f"Messaggio {self.country} {message_count} (ID: {message.id}): {message.text[:100] if message.text else 'NO TEXT'}...")
+            return message.id, asyncio.ensure_future(self.make_deal(message, span))
+
+        try:
+            if not self.runtime.telethon_connected or not client:
+                logger.error(f"❌ Telethon non connesso - impossibile fare scraping {self.country}")
+                return
+
+            logger.info(f"🔍 Scraping {self.country} con Telethon...")
+
+            try:
+                logger.info(f"Lettura messaggi da canale {self.country} {self.source_channel_id}...")
+                logger.info(f"Ultimo message_id {self.country} processato: {self.last_message_id}")
+                started = time.perf_counter()
+
+                async with aclosing(self.iter_new_messages(client, max_pages)) as pages:
+                    async for page in pages:
+                        unread = deque(page)
+                        while (unread or parsing) and (limit is None or deals_found < limit):
+                            # Fino a WORKER_PARSE_CONCURRENCY parse sovrapposti in
+                            # anticipo; i deals escono nell'ordine dei messaggi
+                            while unread and len(parsing) < self.parse_window:
+                                parsing.append(start(unread.popleft()))
+                            message_id, task = parsing.popleft()
+                            deal = await task if task else None
+                            # ASIN registrato alla consegna: un parse annullato non lo blocca
+                            if deal and self.claim_asin(deal):
+                                deals_found += 1
+                                logger.info(f"✅ Deal {self.country} {deals_found} trovato: {deal['asin']}")
+                                yield deal
+                            delivered_id = message_id
+
+                        self._commit(delivered_id)
+                        if limit is not None and deals_found >= limit:
+                            logger.info(f"📦 Limite di {limit} deals {self.country} raggiunto al messaggio {delivered_id}")
+                            break
+
+                SCRAPE_SECONDS.labels(self.country).observe(time.perf_counter() - started)
+                logger.info(f"✅ Telethon {self.country}: {message_count} messaggi letti, {deals_found} deals trovati")
+
+            except Exception as e:
+                span.fail(e)
+                logger.error(f"❌ Errore durante lettura messaggi {self.country}: {e}")
+                import traceback
+                logger.error(traceback.format_exc())
+
+        except Exception as e:
+            span.fail(e)
+            logger.error(f"❌ Errore Telethon {self.country}: {e}")
+            import traceback
+            logger.error(traceback.format_exc())
+        finally:
+            # Stream interrotto dal client: i parse rimasti non servono più, i
+            # loro messaggi restano oltre last_message_id e vengono riletti
+            for _, task in parsing:
+                if task:
+                    task.cancel()
+            self._commit(delivered_id)
+            span.end(messages=message_count, deals=deals_found)
+
+    async def iter_scrape(self, limit: Optional[int] = None, traceparent: Optional[str] = None) -> AsyncIterator[Dict]:
+        """Scrape in streaming (al massimo `limit` deals, il resto resta nel canale)"""
+        logger.info(f"🔍 Scraping {self.country} (streaming)...")
+
+        # Inizializza Telethon al primo scrape
+        if not self.runtime.telethon_connected:
+            await self.runtime.init_telethon()
+
+        deals_found = 0
+        try:
+            # Riconciliazione: prima i deals che il push non è riuscito a consegnare
+            # e quelli rimasti oltre il limite nei cicli precedenti
+            self.runtime.collect_pending()
+            while self.backlog and (limit is None or deals_found < limit):
+                # Il deal esce dal backlog solo quando il consumatore chiede il
+                # successivo (scrittura riuscita); stream chiuso prima: torna in testa
+                deal = self.backlog.popleft()
+                delivered = False
+                try:
+                    yield deal
+                    delivered = True
+                finally:
+                    if not delivered:
+                        self.backlog.appendleft(deal)
+                deals_found += 1
+
+            # Live: i nuovi messaggi sono già nel buffer, nessuna lettura del canale
+            if self.runtime.live_active:
+                return
+
+            if limit is not None and deals_found >= limit:
+                return
+
+            # Oltre il limite la lettura si ferma: last_message_id resta sull'ultimo
+            # deal consegnato. aclosing: stream chiuso dal coordinatore, salvato subito
+            remaining = limit - deals_found if limit is not None else None
+            async with self.scrape_lock, \
+                    aclosing(self.iter_channel_telethon(traceparent, remaining, self.scrape_max_pages)) as deals:
+                async for deal in deals:
+                    deals_found += 1
+                    yield deal
+        finally:
+            self.last_scrape_time = datetime.now()
+            logger.info(f"✅ Scraping {self.country} in streaming completato: {deals_found} deals")
+
+    async def scrape_channel(self, limit: Optional[int] = None, traceparent: Optional[str] = None) -> List[Dict]:
+        """Scrape - Solo Telethon"""
+        deals = [deal async for deal in self.iter_scrape(limit, traceparent)]
+        logger.info(f"✅ Scraping {self.country} completato: {len(deals)} deals")
+        return deals
+
+    async def push_once(self):
+        """Un giro di push: ogni nuovo deal va subito al coordinatore"""
+        async with self.scrape_lock, aclosing(self.iter_channel_telethon()) as deals:
+            async for deal in deals:
+                self.runtime.pusher.push(deal)
+        self.last_scrape_time = datetime.now()
+
+    async def drain(self, timeout: float):
+        """Attende lo scrape in corso senza lasciarne partire altri"""
+        try:
+            await asyncio.wait_for(self.scrape_lock.acquire(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⏱️ Scrape {self.country} ancora in corso alla deadline di shutdown")
+
+    def stats(self) -> Dict:
+        return {
+            'last_scrape_time': self.last_scrape_time.isoformat() if self.last_scrape_time else None,
+            'last_message_id': self.last_message_id,
+            'backlog': len(self.backlog),
+            'live': self.runtime.live_active,
+        }
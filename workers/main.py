@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Worker - Deal Scout multi-paese
+Un solo processo e una sola connessione Telethon per tutti i canali
+sorgente configurati. Ogni sorgente ha i suoi endpoint sotto /<paese>/
+(/uk/scrape, /it/scrape, ...); /health e /metrics sono del processo.
+Server HTTP e Telethon condividono lo stesso event loop asyncio.
+"""
+
+import os
+import sys
+import asyncio
+import logging
+from typing import List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from workers.core.runtime import WorkerRuntime
+
+# Configurazione logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+async def serve(countries: Optional[List[str]] = None, port: Optional[int] = None):
+    runtime = WorkerRuntime(countries)
+    if port:
+        runtime.http_port = port
+    await runtime.run()
+
+
+def main(countries: Optional[List[str]] = None, port: Optional[int] = None):
+    """Avvia il runtime; countries limita le sorgenti a quelle indicate (script storici)"""
+    try:
+        asyncio.run(serve(countries, port))
+    except Exception as e:
+        logger.error(f"Errore avvio: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    main()